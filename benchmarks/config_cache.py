@@ -0,0 +1,140 @@
+#    benchmarks.config_cache - benchmark and stress test of the parsed conf cache
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Measure how long building a ConfigEditor takes with a cold and a warm parsed conf cache,
+then check the cache against concurrent edits of the conf file.
+
+While a writer process keeps rewriting ubuntu-wsl.conf, every editor must see one of the
+versions written, and once the writer stops, the last one. The writer either only rewrites
+the file, or also backdates it so that the cache is written and read during the run.
+Exits with 1 when a stale value is seen.
+
+Usage: python3 benchmarks/config_cache.py [--runs 200] [--duration 3]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO)
+
+from ubuntuwslctl.core import cache  # noqa: E402
+from ubuntuwslctl.core.default import conf_def  # noqa: E402
+from ubuntuwslctl.core.editor import UbuntuWSLConfigEditor  # noqa: E402
+from ubuntuwslctl.utils.helper import atomic_write  # noqa: E402
+
+_CONF = """[Interop]
+guiintegration = {0}
+audiointegration = {0}
+advancedipdetection = false
+
+[Motd]
+wslnewsenabled = true
+"""
+
+
+def _sandbox(root):
+    conf = os.path.join(root, "ubuntu-wsl.conf")
+    conf_def['ubuntu']['_file_location'] = conf
+    del conf_def['ubuntu']['_env_cache']
+    cache.SYSTEM_CACHE_DIR = os.path.join(root, "cache")
+    os.environ['XDG_CACHE_HOME'] = os.path.join(root, "user-cache")
+    return conf
+
+
+def _write(conf, version, backdate):
+    # both values have the same length, so that only the mtime and the inode tell them apart
+    atomic_write(conf, _CONF.format("true " if version % 2 else "false"))
+    if backdate:
+        mtime = time.time_ns() - 10 * 10 ** 9 + version
+        os.utime(conf, ns=(mtime, mtime))
+
+
+def _writer(conf, backdate, stop):
+    version = 0
+    while not stop.is_set():
+        version += 1
+        _write(conf, version, backdate)
+    _write(conf, version + 1, backdate)
+    _write(conf, 0, backdate)
+
+
+def _time(runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        UbuntuWSLConfigEditor()
+    return (time.perf_counter() - start) / runs
+
+
+def _read():
+    return UbuntuWSLConfigEditor().get_config()['Interop']['guiintegration']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and stress test of the parsed conf cache")
+    parser.add_argument("--runs", type=int, default=200, help="editors built per measure")
+    parser.add_argument("--duration", type=float, default=3, help="seconds of concurrent edits per mode")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="ubuntu-wsl-cache-")
+    failed = False
+    try:
+        conf = _sandbox(root)
+        _write(conf, 0, backdate=True)
+
+        shutil.rmtree(cache.SYSTEM_CACHE_DIR, ignore_errors=True)
+        cold = time.perf_counter()
+        UbuntuWSLConfigEditor()
+        cold = time.perf_counter() - cold
+        warm = _time(args.runs)
+        print("{:<30} {:>8.1f}us".format("cold (parse, then cache)", cold * 10 ** 6))
+        print("{:<30} {:>8.1f}us".format("warm (cached)", warm * 10 ** 6))
+
+        for backdate in (False, True):
+            stop = multiprocessing.Event()
+            writer = multiprocessing.Process(target=_writer, args=(conf, backdate, stop))
+            writer.start()
+            seen = {}
+            deadline = time.monotonic() + args.duration
+            while time.monotonic() < deadline:
+                value = _read()
+                seen[value] = seen.get(value, 0) + 1
+            stop.set()
+            writer.join()
+            last = _read()
+            mode = "backdated" if backdate else "rewritten"
+            print("{:<30} reads {}, last {}".format(mode, seen, last))
+            if set(seen) - {"true", "false"} or last != "false":
+                print("    stale or broken value seen")
+                failed = True
+    finally:
+        shutil.rmtree(root)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
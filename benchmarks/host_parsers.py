@@ -0,0 +1,88 @@
+#    benchmarks.host_parsers - check of the Windows host parsers against sample files
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Check `parse_route`, `parse_resolv_conf` and `parse_powershell` against the sample files of
+benchmarks/fixtures/host, and time each parser:
+
+    route                   a default route through a gateway, after the route of the subnet
+    route_no_default        no default route through a gateway, only one on a point-to-point link
+    resolv.conf             several nameservers, a commented one and an IPv6 one first
+    resolv.conf_ipv6_only   only IPv6 nameservers
+    powershell_crlf_bom     CRLF line endings after a byte order mark; the adapter with a gateway
+                            lists an IPv6 address first
+    powershell_no_gateway   CRLF line endings, and no adapter with a gateway
+
+The files are read as they are, without translating the line endings.
+
+Usage: python3 benchmarks/host_parsers.py [--runs 10000]
+
+Exits with 1 when a parser does not return the expected address.
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO)
+FIXTURES = os.path.join(REPO, "benchmarks", "fixtures", "host")
+
+from ubuntuwslctl.core.host import parse_powershell, parse_resolv_conf, parse_route  # noqa: E402
+
+# fixture: (parser, expected result)
+CASES = {
+    "route": (parse_route, "192.168.16.1"),
+    "route_no_default": (parse_route, None),
+    "resolv.conf": (parse_resolv_conf, "172.20.16.1"),
+    "resolv.conf_ipv6_only": (parse_resolv_conf, None),
+    "powershell_crlf_bom": (parse_powershell, "192.168.1.23"),
+    "powershell_no_gateway": (parse_powershell, None),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Windows host parsers against sample files")
+    parser.add_argument("--runs", type=int, default=10000, help="runs of each parser to time")
+    args = parser.parse_args()
+
+    failures = []
+    print("{:<24}{:>16}{:>16}{:>10}".format("fixture", "expected", "parsed", "time"))
+    for name, (parse, expected) in CASES.items():
+        with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+        parsed = parse(content)
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            parse(content)
+        elapsed = (time.perf_counter() - start) / max(args.runs, 1)
+        print("{:<24}{:>16}{:>16}{:>8.1f}us".format(name, str(expected), str(parsed), elapsed * 10 ** 6))
+        if parsed != expected:
+            failures.append("{}: {} returned {!r}, expected {!r}".format(name, parse.__name__, parsed, expected))
+
+    if failures:
+        print("Failures:")
+        print("\n".join("  " + failure for failure in failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#    benchmarks.importtime - import-time budget of the ubuntuwsl CLI
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Check the cold-start cost of the hot CLI paths with `python3 -X importtime`.
+
+For each command, the import time of `ubuntuwslctl.main` and everything it pulls in
+must stay under the budget, and modules only needed by other commands must not be
+imported at all. Exits with 1 when a check fails.
+
+Usage: python3 benchmarks/importtime.py [--budget-scale 1.0] [--runs 5]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+REPO = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# command: (budget in milliseconds, modules that must not be imported)
+CHECKS = {
+    "--version": (5, ("configparser", "json", "urwid", "ubuntuwslctl.core.handler")),
+    "show -s ubuntu.Motd.wslnewsenabled": (30, ("json", "urwid", "ubuntuwslctl.core.probe")),
+    "host -S resolv": (25, ("configparser", "json", "urwid", "ubuntuwslctl.core.handler")),
+}
+
+_RUNNER = ("import sys; sys.path.insert(0, {repo!r}); sys.argv = ['ubuntuwsl'] + {argv!r}; "
+           "from ubuntuwslctl.main import main; main()")
+
+
+def _importtime(command):
+    """
+    Run a command with `-X importtime`.
+
+    Returns:
+        a tuple of the cumulative import time of ubuntuwslctl.main in milliseconds
+        (including the modules imported lazily while running), and the imported module names.
+    """
+    code = _RUNNER.format(repo=REPO, argv=command.split())
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    total = 0
+    modules = set()
+    started = False
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match is None:
+            continue
+        self_us, module = int(match.group(1)), match.group(4)
+        modules.add(module)
+        # everything after the first module of the package is caused by the CLI
+        started = started or module.startswith("ubuntuwslctl")
+        if started:
+            total += self_us
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget of the ubuntuwsl CLI")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="multiply every budget, for slower machines")
+    parser.add_argument("--runs", type=int, default=5, help="runs per command, the fastest one counts")
+    args = parser.parse_args()
+
+    # make sure the bytecode is cached, as it is once installed
+    subprocess.run([sys.executable, "-m", "compileall", "-q", os.path.join(REPO, "ubuntuwslctl")], check=True)
+
+    failed = False
+    for command, (budget, forbidden) in CHECKS.items():
+        runs = [_importtime(command) for _ in range(args.runs)]
+        spent = min(run[0] for run in runs)
+        modules = runs[0][1]
+        budget *= args.budget_scale
+        status = "ok" if spent <= budget else "OVER BUDGET"
+        print("{:<40} {:>7.1f}ms / {:>5.1f}ms  {}".format(command, spent, budget, status))
+        failed = failed or spent > budget
+        unexpected = sorted(m for m in modules if m in forbidden)
+        if unexpected:
+            print("    imports {}".format(", ".join(unexpected)))
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
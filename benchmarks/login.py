@@ -0,0 +1,257 @@
+#    benchmarks.login - benchmark of the login script wsl-integration.sh
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Measure how long sourcing debian/wsl-integration.sh takes on a plain Linux box.
+
+`wslsys`, `powershell.exe`, `xvinfo` and `pactl` are replaced by stubs with configurable
+delays and results, and the conf files live in a sandbox. The script is sourced with
+every combination of the Ubuntu WSL settings, and the wall time is reported per stage:
+
+    conf    turning ubuntu-wsl.conf into UBUNTU_WSL_* variables
+    host    detecting the Windows host, unless AdvancedIPDetection is on
+    probe   probing the X server and the PulseAudio server, after detecting the Windows host
+            when AdvancedIPDetection is on
+
+Usage:
+    python3 benchmarks/login.py [--runs N] [--delay powershell=1.5] [--result xvinfo=fail]
+                                [--save results.json] [--baseline results.json --threshold 0.2]
+
+With --baseline, exits with 1 when the median of any stage is slower than the baseline
+by more than the threshold.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+SCRIPT = os.path.join(REPO, "debian", "wsl-integration.sh")
+
+STAGES = (
+    ("conf", None),
+    ("host", "# the... like, the real detection part"),
+    ("probe", "# set DISPLAY"),
+)
+
+STUB_DEFAULTS = {
+    "wslsys": (0.01, "2"),
+    "powershell.exe": (1.0, "ok"),
+    "xvinfo": (0.05, "ok"),
+    "pactl": (0.05, "fail"),
+}
+
+_POWERSHELL_OUTPUT = """
+DHCPEnabled      : True
+IPAddress        : {127.0.0.1}
+DefaultIPGateway : {127.0.0.1}
+DNSDomain        :
+"""
+
+_STUB = """#!/bin/sh
+sleep {delay}
+case "{name}" in
+    wslsys)
+        [ "$1" = "-V" ] && echo "{result}" && exit 0
+        echo 1
+        ;;
+    powershell.exe)
+        [ "{result}" = "fail" ] && exit 1
+        cat <<'EOF'
+{powershell}
+EOF
+        ;;
+    *)
+        [ "{result}" = "fail" ] && exit 1
+        echo "Default Sink: alsa_output"
+        ;;
+esac
+exit 0
+"""
+
+_UBUNTUWSL = """#!/bin/sh
+exec "{python}" -c 'import sys; sys.path.insert(0, "{repo}"); sys.argv[0] = "ubuntuwsl"; \
+from ubuntuwslctl.main import main; main()' "$@"
+"""
+
+_CONF = """[Interop]
+guiintegration = {gui}
+audiointegration = {audio}
+advancedipdetection = {advanced}
+
+[Motd]
+wslnewsenabled = true
+"""
+
+
+def _sandbox(root, stubs):
+    """
+    Populate the sandbox with the stubs and a copy of the login script using the sandbox paths.
+    """
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    for name, (delay, result) in stubs.items():
+        with open(os.path.join(bin_dir, name), "w") as f:
+            f.write(_STUB.format(name=name, delay=delay, result=result, powershell=_POWERSHELL_OUTPUT))
+    with open(os.path.join(bin_dir, "ubuntuwsl"), "w") as f:
+        f.write(_UBUNTUWSL.format(python=sys.executable, repo=REPO))
+    for name in os.listdir(bin_dir):
+        os.chmod(os.path.join(bin_dir, name), 0o755)
+    with open(os.path.join(root, "resolv.conf"), "w") as f:
+        f.write("nameserver 127.0.0.1\n")
+
+    with open(SCRIPT) as f:
+        script = f.read()
+    for path in ("/etc/default/ubuntu-wsl/ubuntu-wsl.conf", "/etc/ubuntu-wsl.conf",
+                 "/var/cache/ubuntu-wsl/ubuntu-wsl.env", "/etc/resolv.conf"):
+        script = script.replace(path, os.path.join(root, path.lstrip("/").replace("/", "_")))
+    script_path = os.path.join(root, "wsl-integration.sh")
+    with open(script_path, "w") as f:
+        f.write(script)
+    return bin_dir, script_path
+
+
+def _stage_lines(script_path):
+    with open(script_path) as f:
+        lines = f.read().splitlines()
+    starts = []
+    for name, marker in STAGES:
+        start = 0 if marker is None else next(i for i, line in enumerate(lines, 1) if marker in line)
+        starts.append((start, name))
+    return starts
+
+
+def _configure(root, gui, audio, advanced, cached):
+    conf = os.path.join(root, "etc_ubuntu-wsl.conf")
+    cache = os.path.join(root, "var_cache_ubuntu-wsl_ubuntu-wsl.env")
+    values = {"gui": gui, "audio": audio, "advanced": advanced}
+    with open(conf, "w") as f:
+        f.write(_CONF.format(**values))
+    if os.path.exists(cache):
+        os.unlink(cache)
+    if cached:
+        with open(cache, "w") as f:
+            for key, value in (("INTEROP_GUIINTEGRATION", gui), ("INTEROP_AUDIOINTEGRATION", audio),
+                               ("INTEROP_ADVANCEDIPDETECTION", advanced), ("MOTD_WSLNEWSENABLED", "true")):
+                f.write("declare -r -g UBUNTU_WSL_{}={}\n".format(key, value))
+        mtime = os.stat(conf).st_mtime_ns + 1000000
+        os.utime(cache, ns=(mtime, mtime))
+
+
+def _source(bin_dir, script_path, stage_lines):
+    """
+    Source the script once with tracing on, and split the wall time by stage.
+    """
+    trace = script_path + ".trace"
+    command = ('exec 9>"{trace}"; BASH_XTRACEFD=9; PS4=\'+${{EPOCHREALTIME}} ${{LINENO}} \'; '
+               'set -x; . "{script}"; : __bench_end').format(trace=trace, script=script_path)
+    env = {"PATH": bin_dir + ":/usr/bin:/bin", "HOME": os.path.dirname(bin_dir), "LC_ALL": "C"}
+    subprocess.run(["bash", "--norc", "--noprofile", "-c", command], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    events = []
+    with open(trace) as f:
+        for line in f:
+            match = re.match(r"^\++(\d+\.\d+) (\d+) (.*)$", line)
+            if match:
+                events.append((float(match.group(1)), int(match.group(2)), match.group(3)))
+    # the first event is the `.` command itself, the last one the end marker
+    start, end = events[0][0], events[-1][0]
+    result = {name: 0.0 for name, _ in STAGES}
+    for (time_a, line, _), (time_b, _, _) in zip(events[1:-1], events[2:]):
+        stage = [name for first, name in stage_lines if first <= line][-1]
+        result[stage] += time_b - time_a
+    result["total"] = end - start
+    return result
+
+
+def _parse_stub_options(options, index):
+    stubs = {name: list(value) for name, value in STUB_DEFAULTS.items()}
+    for option in options or []:
+        name, value = option.split("=", 1)
+        stubs[name][index] = value
+    return stubs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of wsl-integration.sh")
+    parser.add_argument("--runs", type=int, default=5, help="runs per combination")
+    parser.add_argument("--delay", action="append", metavar="STUB=SECONDS",
+                        help="delay of a stub, e.g. powershell.exe=1.5")
+    parser.add_argument("--result", action="append", metavar="STUB=RESULT",
+                        help="result of a stub: ok or fail; for wslsys, the WSL version")
+    parser.add_argument("--save", help="write the medians to this JSON file")
+    parser.add_argument("--baseline", help="compare the medians with this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown against the baseline")
+    parser.add_argument("--slack", type=float, default=0.005,
+                        help="allowed absolute slowdown against the baseline, in seconds")
+    args = parser.parse_args()
+
+    stubs = _parse_stub_options(args.delay, 0)
+    for name, result in _parse_stub_options(args.result, 1).items():
+        stubs[name][1] = result[1]
+
+    root = tempfile.mkdtemp(prefix="ubuntu-wsl-bench-")
+    medians = {}
+    try:
+        bin_dir, script_path = _sandbox(root, stubs)
+        stage_lines = _stage_lines(script_path)
+        names = [name for name, _ in STAGES] + ["total"]
+        print("{:<40}".format("gui/audio/advanced/cache") + "".join("{:>10}".format(n) for n in names))
+        for combination in itertools.product(("true", "false"), repeat=3):
+            for cached in (True, False):
+                _configure(root, *combination, cached)
+                runs = [_source(bin_dir, script_path, stage_lines) for _ in range(args.runs)]
+                key = "/".join(combination + ("cache" if cached else "parse",))
+                medians[key] = {n: statistics.median(run[n] for run in runs) for n in names}
+                print("{:<40}".format(key) + "".join("{:>9.1f}ms".format(medians[key][n] * 1000)
+                                                     for n in names))
+    finally:
+        shutil.rmtree(root)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(medians, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = []
+        for key, stages in medians.items():
+            for name, value in stages.items():
+                allowed = baseline.get(key, {}).get(name)
+                if allowed is not None and value > allowed * (1 + args.threshold) + args.slack:
+                    regressions.append("{} {}: {:.1f}ms > {:.1f}ms".format(key, name, value * 1000, allowed * 1000))
+        if regressions:
+            print("Regressions against {}:".format(args.baseline))
+            print("\n".join("  " + r for r in regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#    benchmarks.probe_sockets - check of the X11 and PulseAudio socket probes against local listeners
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Check `probe_x11_socket` and `probe_pulse_socket` against stand-in servers listening on
+127.0.0.1, and time each probe.
+
+Each stand-in reads the handshake of the probe, checks it, then answers as a server would:
+
+    X11         setup replies Failed (0), Success (1) and Authenticate (2) tell a live server,
+                any other first byte does not
+    PulseAudio  REPLY and ERROR to the AUTH command tell a live server, any other command does not
+
+Every probe is also run against a listener that accepts but never answers, which must fail
+once the deadline is over, against peers that close the connection before a whole answer,
+and against a closed port.
+
+Usage: python3 benchmarks/probe_sockets.py [--timeout 0.2]
+
+Exits with 1 when a probe does not tell what the stand-in is, when a handshake is not the
+expected one, or when a probe outlives its deadline.
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+REPO = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO)
+
+from ubuntuwslctl.core import probe  # noqa: E402
+
+# slack over the deadline of a probe, for the threads and the loopback
+_SLACK = 0.1
+
+
+def _x_reply(status):
+    # status, reason length, protocol major and minor versions, length of the rest in 4 bytes
+    return struct.pack('<BBHHH', status, 0, 11, 0, 0)
+
+
+def _pa_reply(command):
+    message = probe._PA_TAG_U32 + struct.pack('>L', command) + probe._PA_TAG_U32 + struct.pack('>L', 0)
+    return struct.pack('>LLLLL', len(message), 0xFFFFFFFF, 0, 0, 0) + message
+
+
+class _Listener:
+    """
+    A server accepting one connection on 127.0.0.1: it reads a request of a given length,
+    then sends its answer and waits for the probe to close the connection.
+
+    Args:
+        request: the request the probe must send.
+        answer: the bytes to send back, or None to never answer.
+        close: close the connection right after the answer instead.
+        port_above: only take a port above this one, e.g. to reach it as an X display.
+    """
+
+    def __init__(self, request, answer, close=False, port_above=0):
+        self.request = request
+        self.answer = answer
+        self.close_early = close
+        self.received = None
+        while True:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.bind(("127.0.0.1", 0))
+            self.port = self.sock.getsockname()[1]
+            if self.port > port_above:
+                break
+            self.sock.close()
+        self.sock.listen(1)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        conn, _address = self.sock.accept()
+        with conn:
+            conn.settimeout(5)
+            received = b''
+            try:
+                while len(received) < len(self.request):
+                    chunk = conn.recv(len(self.request) - len(received))
+                    if not chunk:
+                        break
+                    received += chunk
+                self.received = received
+                if self.answer is None:
+                    conn.recv(1)  # until the probe gives up
+                    return
+                conn.sendall(self.answer)
+                if not self.close_early:
+                    conn.recv(1)
+            except OSError:
+                pass
+
+    def close(self):
+        self.sock.close()
+        self.thread.join(1)
+
+
+def _closed_port(port_above=0):
+    while True:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        if port > port_above:
+            return port
+
+
+def _x11(port, timeout):
+    return probe.probe_x11_socket("127.0.0.1", timeout, display=port - probe.X_PORT)
+
+
+def _pulse(port, timeout):
+    return probe.probe_pulse_socket("127.0.0.1", timeout, port=port)
+
+
+def _cases():
+    """
+    The cases as (name, probe, request, answer, close, expected), see `_Listener`; the request
+    is None for a closed port.
+    """
+    x_setup, pa_auth = probe._X_SETUP, probe._PA_AUTH
+    return [
+        ("x11 Failed", _x11, x_setup, _x_reply(0), False, True),
+        ("x11 Success", _x11, x_setup, _x_reply(1), False, True),
+        ("x11 Authenticate", _x11, x_setup, _x_reply(2), False, True),
+        ("x11 unknown reply", _x11, x_setup, _x_reply(7), False, False),
+        ("x11 short reply", _x11, x_setup, _x_reply(1)[:4], True, False),
+        ("x11 closed early", _x11, x_setup, b'', True, False),
+        ("x11 no answer", _x11, x_setup, None, False, False),
+        ("x11 closed port", _x11, None, None, False, False),
+        ("pulse REPLY", _pulse, pa_auth, _pa_reply(probe._PA_COMMAND_REPLY), False, True),
+        ("pulse ERROR", _pulse, pa_auth, _pa_reply(probe._PA_COMMAND_ERROR), False, True),
+        ("pulse unknown command", _pulse, pa_auth, _pa_reply(3), False, False),
+        ("pulse short reply", _pulse, pa_auth, _pa_reply(probe._PA_COMMAND_REPLY)[:12], True, False),
+        ("pulse closed early", _pulse, pa_auth, b'', True, False),
+        ("pulse no answer", _pulse, pa_auth, None, False, False),
+        ("pulse closed port", _pulse, None, None, False, False),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the socket probes against local listeners")
+    parser.add_argument("--timeout", type=float, default=0.2, help="deadline of each probe, in seconds")
+    args = parser.parse_args()
+
+    failures = []
+    print("{:<24}{:>10}{:>10}{:>10}".format("case", "expected", "probed", "time"))
+    for name, run, request, answer, close, expected in _cases():
+        listener = None
+        if request is None:
+            port = _closed_port(probe.X_PORT)
+        else:
+            listener = _Listener(request, answer, close, probe.X_PORT)
+            port = listener.port
+        start = time.monotonic()
+        probed = run(port, args.timeout)
+        elapsed = time.monotonic() - start
+        if listener is not None:
+            listener.close()
+        print("{:<24}{:>10}{:>10}{:>8.1f}ms".format(name, str(expected), str(probed), elapsed * 1000))
+        if probed != expected:
+            failures.append("{}: probed {}, expected {}".format(name, probed, expected))
+        if listener is not None and listener.received != request:
+            failures.append("{}: unexpected handshake {!r}".format(name, listener.received))
+        if elapsed > args.timeout + _SLACK:
+            failures.append("{}: took {:.1f}ms, over the deadline".format(name, elapsed * 1000))
+
+    if failures:
+        print("Failures:")
+        print("\n".join("  " + failure for failure in failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
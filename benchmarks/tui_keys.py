@@ -0,0 +1,265 @@
+#    benchmarks.tui_keys - headless regression benchmark of the TUI driven by scripted keys
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Drive the TUI with a scripted key sequence, check the conf files it writes, and time each
+action over schemas of increasing size.
+
+The keys go through the main loop of the TUI as if they were typed, and each action is
+followed by a render of the screen to a canvas; nothing is drawn on the terminal. The conf
+files are copies in a sandbox: debian/ubuntu-wsl.conf and a small wsl.conf. Synthetic
+settings are added to the Ubuntu settings for the larger schemas, one process per size.
+The script is:
+
+    startup     build the TUI and render the first screen
+    navigate    DOWN to the GUI integration checkbox, per key
+    toggle      SPACE on the GUI and the audio integration checkboxes, per key
+    save        F1, checking both conf files, then ENTER to close the popup
+    reload      F5 after the conf file is changed behind the TUI, checking the checkboxes
+    scroll      PAGE DOWN, per key
+    reset       F2 then ENTER on Yes, checking that both conf files hold the defaults
+
+Usage:
+    python3 benchmarks/tui_keys.py [--sizes 0,1000,5000] [--runs 3]
+                                   [--save results.json] [--baseline results.json --threshold 0.2]
+
+Exits with 1 when a conf file does not hold what the TUI should have written, and with
+--baseline, when the median of any action is slower than the baseline by more than the threshold.
+"""
+import argparse
+import configparser
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO)
+
+ACTIONS = ("startup", "navigate", "toggle", "save", "reload", "scroll", "reset")
+SIZE = (100, 40)
+GUI = ('ubuntu', 'Interop', 'guiintegration')
+AUDIO = ('ubuntu', 'Interop', 'audiointegration')
+
+_WSL_CONF = """[automount]
+enabled = true
+root = /mnt/
+"""
+
+
+def _sandbox(root, settings):
+    """
+    Point the conf files and the caches to the sandbox, and add the synthetic settings to the schema.
+    """
+    from ubuntuwslctl.core import cache
+    from ubuntuwslctl.core.default import conf_def
+    ubuntu_conf = os.path.join(root, "ubuntu-wsl.conf")
+    wsl_conf = os.path.join(root, "wsl.conf")
+    shutil.copyfile(os.path.join(REPO, "debian", "ubuntu-wsl.conf"), ubuntu_conf)
+    with open(wsl_conf, "w") as f:
+        f.write(_WSL_CONF)
+    conf_def['ubuntu']['_file_location'] = ubuntu_conf
+    conf_def['ubuntu']['_env_cache'] = os.path.join(root, "ubuntu-wsl.env")
+    conf_def['wsl']['_file_location'] = wsl_conf
+    cache.SYSTEM_CACHE_DIR = os.path.join(root, "cache")
+    os.environ['XDG_CACHE_HOME'] = os.path.join(root, "user-cache")
+
+    for n in range(settings):
+        section = conf_def['ubuntu'].setdefault("Bench{}".format(n // 20),
+                                                {'_friendly_name': "Benchmark {}".format(n // 20)})
+        section["setting{}".format(n)] = {
+            '_friendly_name': "Setting {}".format(n),
+            'default': "true" if n % 3 else "/srv/{}/".format(n),
+            'type': 'bool' if n % 3 else 'path',
+            'tip': "Synthetic setting number {} of the benchmark.".format(n),
+        }
+    return ubuntu_conf, wsl_conf
+
+
+def _read(path):
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    return parser
+
+
+def _check(condition, message):
+    if not condition:
+        raise RuntimeError(message)
+
+
+class _Driver:
+    """
+    Types keys into a `Tui` without a terminal.
+    """
+
+    def __init__(self, tui):
+        self.tui = tui
+        self.loop = tui._loop
+        self.loop.screen_size = SIZE
+
+    def render(self):
+        self.loop.widget.render(SIZE, focus=True)
+
+    def press(self, *keys):
+        """
+        Type keys one at a time, rendering after each of them.
+
+        Returns:
+            the time taken by each key.
+        """
+        durations = []
+        for key in keys:
+            start = time.perf_counter()
+            self.loop.process_input([key])
+            self.render()
+            durations.append(time.perf_counter() - start)
+        return durations
+
+    def focused(self):
+        _check(self.loop.widget is self.tui._body, "a popup is still open")
+        widget, _position = self.tui._walker.get_focus()
+        return widget
+
+    def field(self, key):
+        return next(field for field in self.tui._fields() if tuple(field.get_source()) == key)
+
+    def down_to(self, key):
+        durations = []
+        for _ in range(len(self.tui.rows)):
+            if tuple(getattr(self.focused(), "source", None) or ()) == key:
+                return durations
+            durations += self.press('down')
+        raise RuntimeError("{} not found by going down".format(".".join(key)))
+
+
+def _run(settings):
+    """
+    Run the script once with a number of synthetic settings.
+
+    Returns:
+        the time of each action, as a list of durations: one per key for the actions timed per key.
+    """
+    root = tempfile.mkdtemp(prefix="ubuntu-wsl-tui-")
+    try:
+        ubuntu_conf, wsl_conf = _sandbox(root, settings)
+        from ubuntuwslctl.core.default import conf_def
+        from ubuntuwslctl.core.handler import SuperHandler
+        from ubuntuwslctl.core.schema import keys, specs
+        from ubuntuwslctl.tui import Tui
+        from ubuntuwslctl.utils.helper import atomic_write
+        times = {}
+
+        start = time.perf_counter()
+        driver = _Driver(Tui(SuperHandler()))
+        driver.render()
+        times['startup'] = [time.perf_counter() - start]
+
+        times['navigate'] = driver.down_to(GUI)
+        times['toggle'] = driver.press(' ')
+        times['navigate'] += driver.down_to(AUDIO)
+        times['toggle'] += driver.press(' ')
+
+        with open(wsl_conf) as f:
+            wsl_before = f.read()
+        times['save'] = [sum(driver.press('f1', 'enter'))]
+        interop = _read(ubuntu_conf)['Interop']
+        _check(interop['guiintegration'] == "true" and interop['audiointegration'] == "true",
+               "save: the toggled settings are not written: {}".format(dict(interop)))
+        _check(interop['advancedipdetection'] == "false", "save: an unchanged setting is changed")
+        with open(wsl_conf) as f:
+            _check(f.read() == wsl_before, "save: wsl.conf is written while none of its settings changed")
+
+        with open(ubuntu_conf) as f:
+            atomic_write(ubuntu_conf, f.read().replace("guiintegration = true", "guiintegration = false"))
+        times['reload'] = [sum(driver.press('f5', 'enter'))]
+        _check(driver.field(GUI).get_core_value() == "false", "reload: the changed conf file is not shown")
+        _check(driver.field(AUDIO).get_core_value() == "true", "reload: an unchanged setting is not shown")
+
+        times['scroll'] = driver.press(*['page down'] * 20)
+
+        times['reset'] = [sum(driver.press('f2', 'enter', 'enter'))]
+        for path, config_type in ((ubuntu_conf, 'ubuntu'), (wsl_conf, 'wsl')):
+            parser = _read(path)
+            for key in keys:
+                if key[0] == config_type:
+                    value = parser.get(key[1], key[2], fallback=None)
+                    _check(value == specs[key]['default'],
+                           "reset: {} is {!r} in {}".format(".".join(key), value,
+                                                             os.path.basename(conf_def[config_type]['_file_location'])))
+        return times
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless regression benchmark of the TUI")
+    parser.add_argument("--sizes", default="0,1000,5000", help="comma-separated numbers of synthetic settings")
+    parser.add_argument("--runs", type=int, default=3, help="runs per size")
+    parser.add_argument("--save", help="write the medians to this JSON file")
+    parser.add_argument("--baseline", help="compare the medians with this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown against the baseline")
+    parser.add_argument("--slack", type=float, default=0.002,
+                        help="allowed absolute slowdown against the baseline, in seconds")
+    args = parser.parse_args()
+
+    # the schema is built once per process, so each size and each run gets its own
+    context = multiprocessing.get_context("spawn")
+    medians = {}
+    print("{:<10}".format("settings") + "".join("{:>10}".format(action) for action in ACTIONS))
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for size in (int(size) for size in args.sizes.split(",")):
+            try:
+                runs = [pool.apply(_run, (size,)) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print("{:<10}FAILED: {}".format(size, e))
+                sys.exit(1)
+            medians[str(size)] = {action: statistics.median(d for run in runs for d in run[action])
+                                  for action in ACTIONS}
+            print("{:<10}".format(size) + "".join("{:>8.2f}ms".format(medians[str(size)][action] * 1000)
+                                                  for action in ACTIONS))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(medians, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = []
+        for size, actions in medians.items():
+            for action, value in actions.items():
+                allowed = baseline.get(size, {}).get(action)
+                if allowed is not None and value > allowed * (1 + args.threshold) + args.slack:
+                    regressions.append("{} {}: {:.2f}ms > {:.2f}ms".format(size, action, value * 1000,
+                                                                           allowed * 1000))
+        if regressions:
+            print("Regressions against {}:".format(args.baseline))
+            print("\n".join("  " + r for r in regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#    benchmarks.tui_walker - benchmark of the TUI list walker with a large schema
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Measure the startup and scroll latency of the TUI with a synthetic schema of thousands
+of settings, with the lazy list walker and with every widget built upfront, and the
+latency of each keystroke of a search.
+
+The synthetic sections are added to the Ubuntu settings before the schema index is built,
+and the conf files point to a directory without them, so the defaults are shown.
+Nothing is drawn on the terminal: the body is rendered to a canvas.
+
+Usage: python3 benchmarks/tui_walker.py [--settings 5000] [--per-section 20] [--pages 50]
+                                        [--query "setting 49"]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO)
+
+SIZE = (100, 40)
+
+
+def _synthetic_schema(settings, per_section):
+    from ubuntuwslctl.core.default import conf_def
+    root = tempfile.mkdtemp(prefix="ubuntu-wsl-tui-")
+    conf_def['wsl']['_file_location'] = os.path.join(root, "wsl.conf")
+    conf_def['ubuntu']['_file_location'] = os.path.join(root, "ubuntu-wsl.conf")
+    for n in range(settings):
+        section = conf_def['ubuntu'].setdefault("Bench{}".format(n // per_section),
+                                                {'_friendly_name': "Benchmark {}".format(n // per_section)})
+        section["setting{}".format(n)] = {
+            '_friendly_name': "Setting {}".format(n),
+            'default': "true" if n % 3 else "/srv/{}/".format(n),
+            'type': 'bool' if n % 3 else 'path',
+            'tip': "Synthetic setting number {} of the benchmark.".format(n),
+        }
+
+
+def _eager(tui):
+    """
+    Replace the lazy walker by one holding every widget, as the TUI used to.
+    """
+    import urwid
+    tui._walker = urwid.SimpleListWalker([tui._row(position) for position in range(len(tui.rows))])
+    tui._body.body = urwid.AttrWrap(urwid.TreeListBox(tui._walker), 'body')
+
+
+def _measure(eager, pages):
+    from ubuntuwslctl.core.handler import SuperHandler
+    from ubuntuwslctl.tui import Tui
+
+    start = time.perf_counter()
+    tui = Tui(SuperHandler())
+    if eager:
+        _eager(tui)
+    tui._body.render(SIZE, focus=True)
+    startup = time.perf_counter() - start
+
+    scrolls = []
+    for _ in range(pages):
+        start = time.perf_counter()
+        tui._body.keypress(SIZE, 'page down')
+        tui._body.render(SIZE, focus=True)
+        scrolls.append(time.perf_counter() - start)
+    return tui, startup, scrolls
+
+
+def _measure_search(tui, query):
+    """
+    Type a search query, rendering after each keystroke.
+
+    Returns:
+        the latency of each keystroke, and the number of rows left.
+    """
+    latencies = []
+    tui._unhandled_key('/')
+    for key in query:
+        start = time.perf_counter()
+        tui._body.keypress(SIZE, key)
+        tui._body.render(SIZE, focus=True)
+        latencies.append(time.perf_counter() - start)
+    rows = len(tui._walker)
+    tui._unhandled_key('esc')
+    return latencies, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the TUI list walker")
+    parser.add_argument("--settings", type=int, default=5000, help="number of synthetic settings")
+    parser.add_argument("--per-section", type=int, default=20, help="synthetic settings per section")
+    parser.add_argument("--pages", type=int, default=50, help="pages to scroll down")
+    parser.add_argument("--query", default="setting 49", help="search query to type")
+    args = parser.parse_args()
+
+    _synthetic_schema(args.settings, args.per_section)
+    print("{:<8} {:>6} {:>12} {:>14} {:>14}".format("walker", "rows", "startup", "scroll median", "scroll max"))
+    for eager in (False, True):
+        tui, startup, scrolls = _measure(eager, args.pages)
+        print("{:<8} {:>6} {:>10.1f}ms {:>12.2f}ms {:>12.2f}ms".format(
+            "eager" if eager else "lazy", len(tui.rows), startup * 1000, statistics.median(scrolls) * 1000,
+            max(scrolls) * 1000))
+        if not eager:
+            latencies, rows = _measure_search(tui, args.query)
+
+    print("search {!r}: {} rows left, {:.2f}ms median and {:.2f}ms max per keystroke".format(
+        args.query, rows, statistics.median(latencies) * 1000, max(latencies) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#    benchmarks.validator - micro-benchmark for conf value validation
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+"""
+Measure how many `automount.options` values can be validated per second.
+
+Usage: python3 benchmarks/validator.py [--options 32]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ubuntuwslctl.core.validator import get_validator, validate  # noqa: E402
+
+_OPTIONS = ["uid=1000", "gid=1000", "umask=22", "fmask=11", "metadata", "case=dir", "noatime", "nodev"]
+
+
+def _value(length):
+    return ",".join(_OPTIONS[i % len(_OPTIONS)] for i in range(length))
+
+
+def _rate(stmt, number):
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    return number / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the automount.options validation")
+    parser.add_argument("--options", type=int, default=32, help="mount options per value")
+    length = parser.parse_args().options
+    value = _value(length)
+    number = 2000
+
+    print("automount.options with {} options ({} characters)".format(length, len(value)))
+    # uncached: every call runs the compiled matcher over all the options
+    validator = get_validator("mount")
+    print("  compiled:  {:>12,.0f} validations/s".format(_rate(lambda: validator(value), number)))
+    # cached: repeated values are answered from the memo
+    validate("mount", value)
+    print("  memoized:  {:>12,.0f} validations/s".format(_rate(lambda: validate("mount", value), number)))
+
+
+if __name__ == '__main__':
+    main()
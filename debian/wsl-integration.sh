@@ -17,6 +17,8 @@
 
 CUR_CONF_LOC=/etc/default/ubuntu-wsl/ubuntu-wsl.conf
 [ -f "/etc/ubuntu-wsl.conf" ] && CUR_CONF_LOC=/etc/ubuntu-wsl.conf
+# written by ubuntuwsl each time it changes /etc/ubuntu-wsl.conf
+CUR_ENV_CACHE=/var/cache/ubuntu-wsl/ubuntu-wsl.env
 
 __ubuntu_wsl_conf_handling() {
     section=""
@@ -37,8 +39,16 @@ __ubuntu_wsl_conf_handling() {
     done < $CUR_CONF_LOC
 }
 
-[ -f "$CUR_CONF_LOC" ] && __ubuntu_wsl_conf_handling
+if [ -f "$CUR_CONF_LOC" ]; then
+    # only trust the cache when it is newer than the conf file it is generated from
+    if [ "$CUR_CONF_LOC" = "/etc/ubuntu-wsl.conf" ] && [ -r "$CUR_ENV_CACHE" ] && [ "$CUR_ENV_CACHE" -nt "$CUR_CONF_LOC" ]; then
+        . "$CUR_ENV_CACHE"
+    else
+        __ubuntu_wsl_conf_handling
+    fi
+fi
 unset CUR_CONF_LOC
+unset CUR_ENV_CACHE
 
 # the... like, the real detection part
 if [ "$UBUNTU_WSL_INTEROP_GUIINTEGRATION" = "true" ] || [ "$UBUNTU_WSL_INTEROP_AUDIOINTEGRATION" = "true" ]; then
@@ -46,41 +56,31 @@ if [ "$UBUNTU_WSL_INTEROP_GUIINTEGRATION" = "true" ] || [ "$UBUNTU_WSL_INTEROP_A
         # detect WSL host
         # WSL2
         if [ "$(wslsys -V -s)" = "2" ]; then
-            if [ "$UBUNTU_WSL_INTEROP_ADVANCEDIPDETECTION" = "true" ] && grep enabled /proc/sys/fs/binfmt_misc/WSLInterop >/dev/null; then
-                WSL_HOST_LINE="$(powershell.exe -noprofile -noninteractive -Command Get-WmiObject -class win32_NetworkAdapterConfiguration | grep -n -m 1 "DefaultIPGateway.*: {[0-9a-z]" | cut -d : -f 1)"
-                WSL_HOST="$(powershell.exe -noprofile -noninteractive -Command Get-WmiObject -class win32_NetworkAdapterConfiguration | sed $(( WSL_HOST_LINE - 2 ))','$(( WSL_HOST_LINE + 4 ))'!d' | grep IPAddress | grep -E -o "([0-9]{1,3}[\.]){3}[0-9]{1,3}" | head -1)"
-                unset WSL_HOST_LINE
-                WSL_HOST_X_TIMEOUT=0.2
-                WSL_HOST_PA_TIMEOUT=0.3
+            if [ "$UBUNTU_WSL_INTEROP_ADVANCEDIPDETECTION" = "true" ]; then
+                # detected by the probe itself, so that Python only starts once: default gateway first,
+                # then PowerShell, whose answer is cached, and the nameserver as the last resort
+                WSL_PROBE_ARGS=(--strategy route,powershell,resolv)
             else
-                WSL_HOST="$(awk '/nameserver / {print $2; exit}' /etc/resolv.conf 2>/dev/null)"
-                WSL_HOST_X_TIMEOUT=0.2
-                WSL_HOST_PA_TIMEOUT=0.3
+                WSL_PROBE_ARGS=(--host "$(awk '/nameserver / {print $2; exit}' /etc/resolv.conf 2>/dev/null)")
             fi
+            WSL_HOST_X_TIMEOUT=0.2
+            WSL_HOST_PA_TIMEOUT=0.3
         # WSL1
         else
-            WSL_HOST="${WSL_HOST:-localhost}"
+            WSL_PROBE_ARGS=(--host localhost)
             WSL_HOST_X_TIMEOUT=0.6
             WSL_HOST_PA_TIMEOUT=0.8
         fi
 
-        # set DISPLAY if there is an X11 server running and integration is enabled
-        if [ "$UBUNTU_WSL_INTEROP_GUIINTEGRATION" = "true" ] && type xvinfo > /dev/null 2>&1 && env DISPLAY="${WSL_HOST}:0" timeout "$WSL_HOST_X_TIMEOUT" xvinfo > /dev/null 2>&1; then
-            export DISPLAY="${WSL_HOST}:0"
-            export LIBGL_ALWAYS_INDIRECT=1
-            win_sys_scaling=$(wslsys -S -s)
-            export GDK_SCALE=$win_sys_scaling
-            export QT_SCALE_FACTOR=$win_sys_scaling
-        fi
-        
-        # set up audio if pulse server is reachable only via tcp
-        if [ "$UBUNTU_WSL_INTEROP_AUDIOINTEGRATION" = "true" ] && type pactl > /dev/null 2>&1 \
-        && (! timeout "$WSL_HOST_PA_TIMEOUT" pactl info > /dev/null 2>&1 || timeout "$WSL_HOST_PA_TIMEOUT" pactl info 2> /dev/null | grep -q 'Default Sink: auto_null' ) \
-        && env PULSE_SERVER="tcp:${WSL_HOST}" timeout "$WSL_HOST_PA_TIMEOUT" pactl stat > /dev/null 2>&1; then
-            export PULSE_SERVER="tcp:${WSL_HOST}"
-        fi
-        
-        unset WSL_HOST
+        # set DISPLAY if there is an X11 server running and integration is enabled,
+        # and set up audio if pulse server is reachable only via tcp.
+        # Both are probed at the same time.
+        [ "$UBUNTU_WSL_INTEROP_GUIINTEGRATION" = "true" ] && WSL_PROBE_ARGS+=(--gui)
+        [ "$UBUNTU_WSL_INTEROP_AUDIOINTEGRATION" = "true" ] && WSL_PROBE_ARGS+=(--audio)
+        eval "$(ubuntuwsl probe --x-timeout "$WSL_HOST_X_TIMEOUT" --pa-timeout "$WSL_HOST_PA_TIMEOUT" \
+            "${WSL_PROBE_ARGS[@]}" 2>/dev/null)"
+
+        unset WSL_PROBE_ARGS
         unset WSL_HOST_X_TIMEOUT
         unset WSL_HOST_PA_TIMEOUT
     fi
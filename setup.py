@@ -37,6 +37,7 @@ class build_i18n(distutils.cmd.Command):
             '--add-comments',
             '--from-code=UTF-8',
             '--keyword=pgettext:1c,2',
+            '--keyword=N_',
             '--output=ubuntuwslctl.pot',
             '--files-from=POTFILES.in.tmp',
         ])
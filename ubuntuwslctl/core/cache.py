@@ -0,0 +1,141 @@
+#    ubuntuwslctl.core.cache - cache of the parsed conf files
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import marshal
+import os
+import time
+import zlib
+
+from ubuntuwslctl.utils.helper import atomic_write
+
+SYSTEM_CACHE_DIR = '/var/cache/ubuntu-wsl'
+
+_FORMAT = 2
+# a file changed more recently than this may be changed again without its mtime moving,
+# so it is not cached until it settles
+_RACY_NS = 2 * 10 ** 9
+
+
+def _user_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'ubuntu-wsl')
+
+
+def _cache_dirs():
+    """
+    Where to look for a cache: the one written by root first, then the one of the current user.
+    """
+    if os.getuid() == 0:
+        return [SYSTEM_CACHE_DIR]
+    return [SYSTEM_CACHE_DIR, _user_cache_dir()]
+
+
+def schema_hash(schema):
+    """
+    A hash of the schema of a conf file, so that a cache does not outlive a change of the defaults.
+    """
+    return zlib.crc32(repr(schema).encode())
+
+
+def file_key(path, schema):
+    """
+    The identity of a conf file as cached.
+
+    Args:
+        path: the location of the conf file.
+        schema: the `schema_hash` of the conf file.
+    Returns:
+        (format, path, mtime_ns, size, inode, mode, schema), or None when the file does not exist.
+        The mode is in it so that a cache does not outlive a change of the permissions of the file.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return _FORMAT, path, st.st_mtime_ns, st.st_size, st.st_ino, st.st_mode & 0o777, schema
+
+
+def load(name, key):
+    """
+    Get the cached sections of a conf file.
+    A cache is only trusted when it belongs to root or to the current user, and nobody else can write it.
+
+    Args:
+        name: the name of the cache.
+        key: the `file_key` of the conf file.
+    Returns:
+        the sections as `{section: {setting: value}}`, or None when there is no valid cache.
+    """
+    for cache_dir in _cache_dirs():
+        try:
+            with open(os.path.join(cache_dir, name), 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_uid not in (0, os.getuid()) or st.st_mode & 0o022:
+                    continue
+                cached_key, sections = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            continue
+        if cached_key == key:
+            return sections
+    return None
+
+
+def write(path, content, mode=None, newer_than=None):
+    """
+    Write a cache file, creating its directory.
+    This is a cache only: failing to write it is not an error.
+
+    Args:
+        path: the location of the cache file.
+        content: the content of the cache, see `atomic_write`.
+        mode: the mode of the cache file, see `atomic_write`.
+        newer_than: the file the cache is made from, that the cache must be seen as newer than.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, content, mode)
+        if newer_than is not None:
+            # timestamps can be too coarse to tell the cache from the file written just before
+            mtime = os.stat(newer_than).st_mtime_ns
+            if os.stat(path).st_mtime_ns <= mtime:
+                os.utime(path, ns=(mtime + 1000, mtime + 1000))
+    except OSError:
+        pass
+
+
+def store(name, key, sections):
+    """
+    Cache the sections of a conf file, in the cache of root or of the current user, see `write`.
+    The cache gets the permissions of the conf file, so that it is not readable by the users
+    who cannot read the conf file.
+
+    Args:
+        name: the name of the cache.
+        key: the `file_key` of the conf file, taken before it is read.
+        sections: the sections as `{section: {setting: value}}`.
+    """
+    if time.time_ns() - key[2] < _RACY_NS:
+        return
+    try:
+        content = marshal.dumps((key, {section: dict(settings) for section, settings in sections.items()}))
+    except ValueError:
+        return
+    write(os.path.join(SYSTEM_CACHE_DIR if os.getuid() == 0 else _user_cache_dir(), name), content, key[5])
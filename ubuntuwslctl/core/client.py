@@ -0,0 +1,124 @@
+#    ubuntuwslctl.core.client - client of the ubuntuwsl serve daemon
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import os
+import sys
+
+from ubuntuwslctl.core.formatter import render, write_export
+from ubuntuwslctl.utils.i18n import translation
+
+_ = translation.gettext
+
+SOCKET_PATH = os.environ.get('UBUNTU_WSL_SOCKET') or '/run/ubuntu-wsl/ubuntuwsl.sock'
+CONNECT_TIMEOUT = 0.1
+REQUEST_TIMEOUT = 5
+
+# error names of the protocol, and the exceptions they are raised as
+errors = {
+    'KeyError': KeyError,
+    'ValidationError': AssertionError,
+    'PermissionError': PermissionError,
+    'OSError': OSError,
+    'BadRequest': ValueError,
+}
+
+
+class Client:
+    """
+    A client of `ubuntuwsl serve`, with the same query methods as `SuperHandler`.
+
+    The protocol is JSON lines over a Unix socket: each request is an object with
+    an `op` among `get`, `list`, `set` and `export` and its arguments, and each
+    answer is an object with `ok`, and either the result or `error` and `message`.
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._file = sock.makefile('rwb')
+
+    @classmethod
+    def connect(cls, path=SOCKET_PATH):
+        """
+        Connect to the daemon.
+
+        Returns:
+            the client, or None when the daemon does not run.
+        """
+        if not os.path.exists(path):
+            return None
+        import socket
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            return None
+        sock.settimeout(REQUEST_TIMEOUT)
+        return cls(sock)
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def request(self, op, **arguments):
+        """
+        Send a request and wait for its answer.
+
+        Raises:
+            the exception of `errors` matching the error sent by the daemon, or
+            ConnectionError when the daemon goes away or does not answer in time.
+        """
+        import json
+        arguments['op'] = op
+        try:
+            self._file.write(json.dumps(arguments).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        except OSError as e:
+            raise ConnectionError(_("ubuntuwsl serve did not answer: {}").format(e))
+        if not line:
+            raise ConnectionError(_("ubuntuwsl serve closed the connection"))
+        answer = json.loads(line)
+        if not answer['ok']:
+            raise errors.get(answer['error'], RuntimeError)(answer['message'])
+        return answer
+
+    def get(self, names, is_default=False):
+        return [tuple(item) for item in self.request('get', names=names, default=is_default)['items']]
+
+    def list(self, default=False):
+        return [tuple(item) for item in self.request('list', default=default)['items']]
+
+    def export(self, sparse=False):
+        return self.request('export', sparse=sparse)['config']
+
+    def update_batch(self, changes):
+        self.request('set', changes=[list(change) for change in changes])
+
+    def show(self, names, is_short, is_default, output_format="text"):
+        sys.stdout.write(render(self.get(names, is_default), output_format, is_short))
+
+    def list_all(self, default, output_format="text"):
+        sys.stdout.write(render(self.list(default), output_format))
+
+    def export_file(self, name, sparse=False, output_format="json", compact=False):
+        return write_export(self.export(sparse), name, output_format, compact)
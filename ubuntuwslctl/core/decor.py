@@ -20,7 +20,11 @@
 #  On Debian systems, the complete text of the GNU General
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
 
-from urwid import Divider, WidgetWrap, AttrMap, Text, Button, Padding, CheckBox, Pile, AttrWrap, Edit
+from collections import OrderedDict
+
+from urwid import Divider, WidgetWrap, AttrMap, Text, Button, Padding, CheckBox, Pile, AttrWrap, Edit, ListWalker
+
+from ubuntuwslctl.utils.helper import str2bool
 
 blank = Divider()  # friendly name for Divider
 
@@ -74,7 +78,22 @@ class StyledText(Padding):
         return self.text
 
 
-class StyledCheckBox(Padding):
+class _TrackedValue:
+    """
+    Remember the value a field is loaded with, to tell whether it is changed.
+    """
+
+    def mark_clean(self):
+        """
+        Take the current value as the loaded one, e.g. once it is saved.
+        """
+        self.original = self.get_core_value()
+
+    def is_dirty(self):
+        return self.get_core_value() != self.original
+
+
+class StyledCheckBox(_TrackedValue, Padding):
     def __init__(self, content, default, tooltip, left_margin, source=None):
         """
         General Checkbox Field
@@ -93,6 +112,7 @@ class StyledCheckBox(Padding):
             Padding(Text(tooltip), left=4)
         ])
         super().__init__(self.widget, left=2 + left_margin - 4, right=2)
+        self.mark_clean()
 
     def get_source(self):
         return self.source
@@ -100,8 +120,15 @@ class StyledCheckBox(Padding):
     def get_core_value(self):
         return "true" if self.core.get_state() else "false"
 
+    def set_core_value(self, value):
+        """
+        Show a newly loaded value, e.g. after a reload.
+        """
+        self.core.set_state(str2bool(value), do_callback=False)
+        self.mark_clean()
+
 
-class StyledEdit(Padding):
+class StyledEdit(_TrackedValue, Padding):
     def __init__(self, content, default, tooltip, left_margin, source=None):
         """
         General Edit Field
@@ -121,9 +148,117 @@ class StyledEdit(Padding):
             Padding(Text(tooltip), left=len(text))
         ])
         super().__init__(self.widget, left=2 + left_margin - len(text), right=2)
+        self.mark_clean()
 
     def get_source(self):
         return self.source
 
     def get_core_value(self):
         return self.core.get_edit_text()
+
+    def set_core_value(self, value):
+        """
+        Show a newly loaded value, e.g. after a reload.
+        """
+        self.core.set_edit_text(value)
+        self.mark_clean()
+
+
+class LazyListWalker(ListWalker):
+    """
+    List walker that only builds the widgets the list box asks for, i.e. the visible ones,
+    and keeps the most recently used of them.
+    The widgets are built and kept per item, so that showing another list of items,
+    e.g. to filter them, reuses the widgets already built.
+    """
+
+    def __init__(self, items, factory, cache_size=256, keep=None):
+        """
+        Args:
+            items: the items to show, one per position.
+            factory: a function that builds the widget of an item.
+            cache_size: the number of widgets to keep.
+            keep: a function telling whether a widget must be kept even when the cache
+                is full, e.g. because it holds a change.
+        """
+        self.items = list(items)
+        self.factory = factory
+        self.cache_size = cache_size
+        self.keep = keep
+        self.focus = 0
+        self._cache = OrderedDict()
+
+    def set_items(self, items, focus=0):
+        """
+        Show another list of items, and focus the one at `focus`.
+        """
+        self.items = list(items)
+        self.focus = min(focus, max(len(self.items) - 1, 0))
+        self._modified()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self.items):
+            raise IndexError(position)
+        item = self.items[position]
+        if item in self._cache:
+            self._cache.move_to_end(item)
+            return self._cache[item]
+        widget = self.factory(item)
+        self._cache[item] = widget
+        self._evict()
+        return widget
+
+    def _evict(self):
+        focus = self.items[self.focus] if self.items else None
+        while len(self._cache) > self.cache_size:
+            for item, widget in self._cache.items():
+                if item != focus and not (self.keep is not None and self.keep(widget)):
+                    break
+            else:  # every widget must be kept
+                return
+            del self._cache[item]
+
+    def built(self):
+        """
+        The widgets currently built, as (item, widget).
+        """
+        return list(self._cache.items())
+
+    def next_position(self, position):
+        if position + 1 >= len(self.items):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        return range(len(self.items) - 1, -1, -1) if reverse else range(len(self.items))
+
+    def get_focus(self):
+        if not self.items:
+            return None, None
+        return self[self.focus], self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def get_next(self, position):
+        try:
+            position = self.next_position(position)
+        except IndexError:
+            return None, None
+        return self[position], position
+
+    def get_prev(self, position):
+        try:
+            position = self.prev_position(position)
+        except IndexError:
+            return None, None
+        return self[position], position
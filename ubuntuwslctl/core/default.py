@@ -20,12 +20,52 @@
 #  On Debian systems, the complete text of the GNU General
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
 
+from ubuntuwslctl.utils.i18n import N_
+
+## Type definition for validation ##
+# `pattern` is matched against the whole input, a list of patterns is treated as alternatives.
+# With `separator`, the input is a list of items and every item is matched on its own.
+
+type_def = {
+    'bool': {
+        'pattern': r"true|false",
+        'hint': N_("Input should be either 'true' or 'false'")
+    },
+    'path': {
+        'pattern': r"(/[^/ ]*)+/?",
+        'hint': N_("Input should be a valid UNIX path")
+    },
+    'mount': {
+        'pattern': [
+            # DrvFs mount options
+            r"case=(dir|force|off)", r"metadata", r"(u|g)id=\d+", r"(u|f|d)mask=\d+",
+            # generic filesystem independent mount options
+            r"async", r"(no)?atime", r"(no)?auto", r"(fs|def|root)?context=\w+", r"(no)?dev", r"(no)?diratime",
+            r"dirsync", r"(no)?exec", r"group", r"(no)?iversion", r"(no)?mand", r"_netdev", r"nofail",
+            r"(no)?relatime", r"(no)?strictatime", r"(no)?suid", r"owner", r"remount", r"ro", r"rw",
+            r"_rnetdev", r"sync", r"(no)?user", r"users"
+        ],
+        'separator': ',',
+        'empty_item_hint': N_("an empty entry detected; "),
+        'item_hint': N_("{} is not a valid mount option; "),
+        'hint': N_("Invalid Input: {}Please check "
+                   "https://docs.microsoft.com/en-us/windows/wsl/wsl-config#mount-options "
+                   "for correct valid input")
+    }
+}
+
+## Schema version ##
+# Written in the sparse exports. Bump it when a setting is renamed or removed, or changes its meaning.
+
+schema_version = 1
+
 ## Tooltip and Name definition ##
 
 conf_def = {
     'wsl': {
         '_friendly_name': 'WSL Settings',
         '_file_location': '/etc/wsl.conf',
+        '_env_prefix': 'WSL',
         'automount': {
             '_friendly_name': 'Auto-Mount',
             'enabled': {
@@ -89,6 +129,8 @@ conf_def = {
     'ubuntu': {
         '_friendly_name': 'Ubuntu Settings',
         '_file_location': '/etc/ubuntu-wsl.conf',
+        '_env_cache': '/var/cache/ubuntu-wsl/ubuntu-wsl.env',
+        '_env_prefix': 'UBUNTU_WSL',
         'Interop': {
             '_friendly_name': 'Interoperability',
             'guiintegration': {
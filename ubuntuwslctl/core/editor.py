@@ -19,11 +19,17 @@
 #
 #  On Debian systems, the complete text of the GNU General
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import io
 import os
-import re
 from configparser import ConfigParser
+from contextlib import contextmanager
+from types import MappingProxyType
 
+from ubuntuwslctl.core import cache
 from ubuntuwslctl.core.default import conf_def
+from ubuntuwslctl.core.schema import canonical, specs
+from ubuntuwslctl.core.validator import validate
+from ubuntuwslctl.utils.helper import atomic_write
 from ubuntuwslctl.utils.i18n import translation
 
 _ = translation.gettext
@@ -35,102 +41,267 @@ class ConfigEditor:
         self.raw_conf = conf_def[inst_type]
         self.user_conf = self.raw_conf['_file_location']
         self.default_conf = {}
+        self._staged = {}
+        self.writes = 0
         self._init_default_conf()
+        self.default_view = self._build_default_view()
 
-        self.config = ConfigParser()
-        self.config.BasicInterpolcation = None
-        self.config.read_dict(self.default_conf)
+        self._config = None
+        # taken before reading, so that a change made while reading is seen as one
+        self.stamp = self._stamp()
+        self._sections = self._load()
+
+    def _load(self):
+        """
+        Get the sections of the config from the cache, or parse the conf file and cache them
+        when the file did not change while being parsed.
+        """
+        cache_name = "{}.parsed".format(self.inst_type)
+        schema = cache.schema_hash(self.raw_conf)
+        key = cache.file_key(self.user_conf, schema)
+        sections = cache.load(cache_name, key) if key is not None else None
+        if sections is None:
+            self._config = self._new_config(self.default_conf)
+            if os.path.exists(self.user_conf):
+                self._config.read(self.user_conf)
+            sections = self._config._sections
+            if key is not None and cache.file_key(self.user_conf, schema) == key:
+                cache.store(cache_name, key, sections)
+        return sections
 
-        if os.path.exists(self.user_conf):
-            self.config.read(self.user_conf)
+    @staticmethod
+    def _new_config(sections):
+        config = ConfigParser()
+        config.BasicInterpolcation = None
+        config.read_dict(sections)
+        return config
+
+    @property
+    def config(self):
+        """
+        The ConfigParser of the config. When the sections come from the cache,
+        it is only built once the config is changed. It then holds the dicts of
+        the sections already handed out by `get_config`, so that they see the change.
+        """
+        if self._config is None:
+            config = self._new_config(self._sections)
+            for section, settings in config._sections.items():
+                kept = self._sections.get(section)
+                if kept is not None:
+                    kept.clear()
+                    kept.update(settings)
+                    config._sections[section] = kept
+            self._sections.clear()
+            self._sections.update(config._sections)
+            config._sections = self._sections
+            self._config = config
+        return self._config
 
     def _init_default_conf(self):
         tmp = self.raw_conf
         for j in tmp.keys():
-            if j not in ('_friendly_name', '_file_location'):
+            if not j.startswith('_'):
                 self.default_conf[j] = {}
                 for k in tmp[j].keys():
                     if k != '_friendly_name':
                         self.default_conf[j][k] = tmp[j][k]['default']
 
+    def _build_default_view(self):
+        """
+        Build the read-only view of the default values, used when showing defaults
+        so that the live config is never touched.
+        """
+        optionxform = ConfigParser.optionxform
+        return MappingProxyType({
+            section: MappingProxyType({optionxform(None, k): v for k, v in settings.items()})
+            for section, settings in self.default_conf.items()
+        })
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.user_conf)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def is_stale(self):
+        """
+        Whether the conf file changed on disk since it was read or written by this editor.
+        """
+        return self._stamp() != self.stamp
+
+    def _view(self, is_default=False):
+        return self.default_view if is_default else self._sections
+
     def _get_default(self):
         for section in self.config.sections():
             self.config.remove_section(section)
         self.config.read_dict(self.default_conf)
 
+    def _write(self):
+        """
+        Write the config to the conf file, see `atomic_write`.
+
+        Returns:
+            True if the conf file is written, False if the write is skipped.
+        """
+        buffer = io.StringIO()
+        self.config.write(buffer)
+        written = atomic_write(self.user_conf, buffer.getvalue())
+        if written:
+            self.writes += 1
+            self.stamp = self._stamp()
+        if '_env_cache' in self.raw_conf:
+            self._write_env_cache(self.raw_conf['_env_cache'])
+        return written
+
+    @contextmanager
+    def _rollback(self):
+        """
+        Restore the config when changing or writing it fails, so that it never holds values
+        that are not in the conf file. The dicts of the sections are kept, see `config`.
+        """
+        snapshot = [(section, settings, dict(settings)) for section, settings in self.config._sections.items()]
+        try:
+            yield
+        except OSError:
+            for section in self.config.sections():
+                self.config.remove_section(section)
+            for section, settings, values in snapshot:
+                self.config.add_section(section)
+                settings.clear()
+                settings.update(values)
+                self.config._sections[section] = settings
+            raise
+
+    def _write_env_cache(self, cache_path):
+        """
+        Write the config as a sourceable shell file, so that the login script
+        does not need to parse the conf file on every shell startup.
+        The login script only uses it when it is newer than the conf file, see `cache.write`.
+
+        Args:
+            cache_path: the location of the cache file.
+        """
+        import shlex
+        content = "# Generated by ubuntuwsl from {}. Do not edit.\n".format(self.user_conf)
+        for section, settings in self._view().items():
+            section = "".join(section.split()).upper()
+            for setting, value in settings.items():
+                setting = "".join(setting.split()).upper()
+                value = "".join(value.split()).lower()
+                content += "declare -r -g {}_{}_{}={}\n".format(self.raw_conf['_env_prefix'], section, setting,
+                                                                shlex.quote(value))
+        cache.write(cache_path, content, newer_than=self.user_conf)
+
     def _type_validation(self, config_section, config_setting, input_con):
-        to_validate = self.raw_conf[config_section][config_setting]['type']
-
-        assert to_validate in ("bool", "path", "mount"), _("Unknown type `{}` to be validated.").format(to_validate)
-        if to_validate == "bool":
-            return input_con in ("true", "false"), _("Input should be either 'true' or 'false'")
-        elif to_validate == "path":
-            return re.fullmatch(r"(/[^/ ]*)+/?", input_con) is not None, _("Input should be a valid UNIX path")
-        elif to_validate == "mount":
-            fsimo = [r"async", r"(no)?atime", r"(no)?auto", r"(fs|def|root)?context=\w+", r"(no)?dev", r"(no)?diratime",
-                     r"dirsync", r"(no)?exec", r"group", r"(no)?iversion", r"(no)?mand", r"_netdev", r"nofail",
-                     r"(no)?relatime", r"(no)?strictatime", r"(no)?suid", r"owner", r"remount", r"ro", r"rw",
-                     r"_rnetdev", r"sync", r"(no)?user", r"users"]
-            drvfsmo = r"case=(dir|force|off)|metadata|(u|g)id=\d+|(u|f|d)mask=\d+|"
-            fso = "{0}{1}".format(drvfsmo, '|'.join(fsimo))
-            if input_con == "":
-                return True, ""
-            iset = input_con.split(',')
-            x = True
-            e_t = ""
-            for i in iset:
-                if i == "":
-                    e_t += _("an empty entry detected; ")
-                    x = x and False
-                elif re.fullmatch(fso, i) is not None:
-                    x = x and True
-                else:
-                    e_t += _("{} is not a valid mount option; ").format(i)
-                    x = x and False
-            return x, _("Invalid Input: {}Please check "
-                        "https://docs.microsoft.com/en-us/windows/wsl/wsl-config#mount-options "
-                        "for correct valid input").format(e_t)
-
-
-        return False, _("Something went wrong, but how do you even get here?")
+        return validate(specs[(self.inst_type, config_section, config_setting)]['type'], input_con)
 
     def get_config(self, is_default=False):
-        if is_default:
-            self._get_default()
-        return self.config
+        """
+        Get the sections of the config as `{section: {setting: value}}`.
 
-    def show(self, config_section, config_setting, is_short=False, is_default=False):
-        if is_default:
-            self._get_default()
-        show_str = ""
-        if not is_short:
-            show_str = self.inst_type + "." + config_section + "." + config_setting + ": "
-        print(show_str + self.config[config_section][config_setting])
+        Args:
+            is_default: get the read-only default values instead of the current ones.
+        """
+        return self._view(is_default)
 
-    def show_list(self, config_section, is_short=False, is_default=False):
-        for config_item in self.config[config_section]:
-            self.show(config_section, config_item, is_short, is_default)
+    def show(self, config_section, config_setting, is_default=False):
+        """
+        Get a setting.
 
-    def list(self, is_short=False, is_default=False):
-        for section in self.config.sections():
-            self.show_list(section, is_short, is_default)
+        Returns:
+            a list holding the tuple (config type, section, setting, value).
+        Raises:
+            KeyError: the setting is not in the config, with its full `type.section.setting` name.
+        """
+        config_setting = ConfigParser.optionxform(None, config_setting)
+        try:
+            value = self._view(is_default)[config_section][config_setting]
+        except KeyError:
+            raise KeyError(".".join((self.inst_type, config_section, config_setting)))
+        return [(self.inst_type, config_section, config_setting, value)]
 
-    def update(self, config_section, config_setting, config_value):
+    def get_changed(self):
+        """
+        Get the settings of the schema that differ from their defaults, as `{section: {setting: value}}`.
+        The sections and settings of the conf file that are not in the schema, e.g. `[user]` in
+        wsl.conf, are left out: they have no default to differ from, and cannot be imported.
+        """
+        current = self._view()
+        changed = {}
+        for section, settings in self._view(True).items():
+            for setting, default in settings.items():
+                value = current.get(section, {}).get(setting, default)
+                if value != default:
+                    changed.setdefault(section, {})[setting] = value
+        return changed
+
+    def show_list(self, config_section, is_default=False):
+        """
+        Get all the settings of a section, as a list of (config type, section, setting, value).
+        """
+        return [(self.inst_type, config_section, config_setting, config_value)
+                for config_setting, config_value in self._view(is_default)[config_section].items()]
+
+    def list(self, is_default=False):
+        """
+        Get all the settings, as a list of (config type, section, setting, value).
+        """
+        items = []
+        for section in self._view(is_default):
+            items.extend(self.show_list(section, is_default))
+        return items
+
+    def stage(self, config_section, config_setting, config_value):
+        """
+        Validate a change and hold it until `commit` is called.
+
+        Args:
+            config_section: the section of the setting
+            config_setting: the name of the setting
+            config_value: the value to set
+        """
+        _type, config_section, config_setting = canonical(self.inst_type, config_section, config_setting)
         assert_check, assert_warn = self._type_validation(config_section, config_setting, config_value)
         assert assert_check, assert_warn
-        self.config[config_section][config_setting] = config_value
-        with open(self.user_conf, 'w') as configfile:
-            self.config.write(configfile)
+        self._staged[(config_section, config_setting)] = config_value
+
+    def discard(self):
+        """
+        Drop all the staged changes.
+        """
+        self._staged = {}
+
+    def commit(self):
+        """
+        Apply all the staged changes and write the conf file once.
+
+        Returns:
+            True if the conf file is written, False otherwise.
+        """
+        if not self._staged:
+            return False
+        staged, self._staged = self._staged, {}
+        with self._rollback():
+            for (config_section, config_setting), config_value in staged.items():
+                self.config[config_section][config_setting] = config_value
+            return self._write()
+
+    def update(self, config_section, config_setting, config_value):
+        self.stage(config_section, config_setting, config_value)
+        return self.commit()
 
     def reset(self, config_section, config_setting):
-        self.config[config_section][config_setting] = self.default_conf[config_section][config_setting]
-        with open(self.user_conf, 'w') as configfile:
-            self.config.write(configfile)
+        _type, config_section, config_setting = canonical(self.inst_type, config_section, config_setting)
+        with self._rollback():
+            self.config[config_section][config_setting] = self.default_conf[config_section][config_setting]
+            return self._write()
 
     def reset_all(self):
-        self._get_default()
-        with open(self.user_conf, 'w') as configfile:
-            self.config.write(configfile)
+        with self._rollback():
+            self._get_default()
+            return self._write()
 
 
 class UbuntuWSLConfigEditor(ConfigEditor):
@@ -0,0 +1,185 @@
+#    ubuntuwslctl.core.formatter - output formats for settings
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+from ubuntuwslctl.core.default import conf_def
+from ubuntuwslctl.core.schema import spec
+from ubuntuwslctl.utils.helper import str2bool, timestamp
+
+formats = ("text", "json", "env", "ini", "tsv")
+export_formats = ("json", "ini")
+
+
+def _typed(config_type, section, setting, value):
+    """
+    Convert a value to the Python type of its schema type, i.e. `bool` for booleans.
+    """
+    setting_spec = spec(config_type, section, setting)
+    if setting_spec is not None and setting_spec['type'] == 'bool':
+        return str2bool(value)
+    return value
+
+
+def _render_text(items, is_short):
+    if is_short:
+        return "".join("{}\n".format(value) for _t, _s, _k, value in items)
+    return "".join("{}.{}.{}: {}\n".format(*item) for item in items)
+
+
+def _render_json(items, is_short):
+    import json
+    result = {}
+    for config_type, section, setting, value in items:
+        result.setdefault(config_type, {}).setdefault(section, {})[setting] = \
+            _typed(config_type, section, setting, value)
+    return json.dumps(result, indent=None if is_short else 2) + "\n"
+
+
+def _render_env(items, is_short):
+    import shlex
+    lines = []
+    for config_type, section, setting, value in items:
+        name = "_".join((conf_def[config_type]['_env_prefix'], section, setting))
+        lines.append("{}={}\n".format("".join(name.split()).upper(), shlex.quote(value)))
+    return "".join(lines)
+
+
+def _render_ini(items, is_short):
+    lines = []
+    last_type, last_section = None, None
+    for config_type, section, setting, value in items:
+        if config_type != last_type:
+            if lines:
+                lines.append("\n")
+            lines.append("# {}\n".format(conf_def[config_type]['_file_location']))
+            last_section = None
+        if section != last_section:
+            if last_section is not None:
+                lines.append("\n")
+            lines.append("[{}]\n".format(section))
+        lines.append("{} = {}\n".format(setting, value))
+        last_type, last_section = config_type, section
+    return "".join(lines)
+
+
+def _render_tsv(items, is_short):
+    def escape(field):
+        return field.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+    return "".join("\t".join(escape(field) for field in item) + "\n" for item in items)
+
+
+_renderers = {
+    "text": _render_text,
+    "json": _render_json,
+    "env": _render_env,
+    "ini": _render_ini,
+    "tsv": _render_tsv,
+}
+
+
+def render(items, output_format="text", is_short=False):
+    """
+    Render settings in one of the `formats`, so that it can be written at once.
+
+    Args:
+        items: a list of (config type, section, setting, value).
+        output_format: one of `formats`.
+        is_short: only print the values for `text`, and compact output for `json`.
+    Returns:
+        the rendered string.
+    """
+    return _renderers[output_format](items, is_short)
+
+
+def render_export(exported, output_format="json", compact=False):
+    """
+    Render an export, see `SuperHandler.export`, so that it can be imported back with `parse_export`.
+    In `ini`, the settings are in `[type.section]` sections, and the other keys, e.g. the schema
+    version, in the `[export]` section.
+
+    Args:
+        exported: the export, as `{type: {section: {setting: value}}}` and metadata keys.
+        output_format: one of `export_formats`.
+        compact: leave out the optional whitespace.
+    Returns:
+        the rendered string.
+    """
+    if output_format == "json":
+        import json
+        return json.dumps(exported, separators=(",", ":") if compact else None)
+    separator = "=" if compact else " = "
+    lines = []
+    metadata = [(key, value) for key, value in exported.items() if not isinstance(value, dict)]
+    if metadata:
+        lines.append("[export]\n")
+        lines.extend("{}{}{}\n".format(key, separator, value) for key, value in metadata)
+    for config_type, sections in exported.items():
+        if not isinstance(sections, dict):
+            continue
+        for section, settings in sections.items():
+            if lines and not compact:
+                lines.append("\n")
+            lines.append("[{}.{}]\n".format(config_type, section))
+            lines.extend("{}{}{}\n".format(setting, separator, value) for setting, value in settings.items())
+    return "".join(lines)
+
+
+def write_export(exported, name, output_format="json", compact=False):
+    """
+    Write an export to a file, see `render_export`.
+
+    Args:
+        exported: the export, as `{type: {section: {setting: value}}}` and metadata keys.
+        name: the name of the file, or "" for a name from the time of the export.
+        output_format: one of `export_formats`.
+        compact: leave out the optional whitespace.
+    Returns:
+        the name of the file.
+    """
+    if name == "":
+        name = "exported_settings_{}.{}".format(exported.get('time_exported') or timestamp(), output_format)
+    with open(name, 'w+') as f:
+        f.write(render_export(exported, output_format, compact))
+
+    return name
+
+
+def parse_export(content):
+    """
+    Parse an export rendered by `render_export`, in any of the `export_formats`.
+
+    Returns:
+        the export, as `{type: {section: {setting: value}}}` and metadata keys.
+    """
+    if content.lstrip().startswith("{"):
+        import json
+        return json.loads(content)
+    from configparser import ConfigParser
+    parser = ConfigParser(interpolation=None)
+    parser.optionxform = str
+    parser.read_string(content)
+    exported = {}
+    for name in parser.sections():
+        config_type, dot, section = name.partition(".")
+        if dot:
+            exported.setdefault(config_type, {})[section] = dict(parser[name])
+        else:
+            exported.update(parser[name])
+    return exported
@@ -17,10 +17,16 @@
 #
 #  On Debian systems, the complete text of the GNU General
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
-import json
-import time
+import sys
 
+from ubuntuwslctl.core.default import schema_version
 from ubuntuwslctl.core.editor import UbuntuWSLConfigEditor, WSLConfigEditor
+from ubuntuwslctl.core.formatter import parse_export, render, write_export
+from ubuntuwslctl.core.schema import canonical, resolve
+from ubuntuwslctl.utils.helper import timestamp
+from ubuntuwslctl.utils.i18n import translation
+
+_ = translation.gettext
 
 
 class SuperHandler:
@@ -29,35 +35,102 @@ class SuperHandler:
     """
 
     def __init__(self):
-        self.ubuntu_conf = UbuntuWSLConfigEditor()
-        self.wsl_conf = WSLConfigEditor()
-
-        ubuntu_tmp = (self.ubuntu_conf.get_config())._sections
-        wsl_tmp = (self.wsl_conf.get_config())._sections
-        self.parsed_config = {"ubuntu": ubuntu_tmp, "wsl": wsl_tmp}
+        self._editors = {}
 
     def _select_config(self, type_input):
+        """
+        Get the editor of a config type. Editors are only built, and their conf
+        files only read, when they are first needed.
+        """
         type_input = type_input.lower()
-        if type_input == "ubuntu":
-            return self.ubuntu_conf
-        elif type_input == "wsl":
-            return self.wsl_conf
-        else:
-            raise ValueError("Invalid config name. Please check again.")
+        if type_input not in self._editors:
+            if type_input == "ubuntu":
+                self._editors[type_input] = UbuntuWSLConfigEditor()
+            elif type_input == "wsl":
+                self._editors[type_input] = WSLConfigEditor()
+            else:
+                raise ValueError("Invalid config name. Please check again.")
+        return self._editors[type_input]
+
+    @property
+    def ubuntu_conf(self):
+        return self._select_config("ubuntu")
+
+    @property
+    def wsl_conf(self):
+        return self._select_config("wsl")
+
+    @property
+    def parsed_config(self):
+        ubuntu_tmp = self.ubuntu_conf.get_config()
+        wsl_tmp = self.wsl_conf.get_config()
+        return {"ubuntu": ubuntu_tmp, "wsl": wsl_tmp}
 
     def get_config(self):
         return self.parsed_config
 
+    def invalidate(self):
+        """
+        Forget the editors whose conf file changed on disk, so that they are read again when needed.
+        """
+        for config_type, editor in list(self._editors.items()):
+            if editor.is_stale():
+                del self._editors[config_type]
+
+    @property
+    def writes(self):
+        """
+        Number of conf files actually written by this handler.
+        """
+        return sum(editor.writes for editor in self._editors.values())
+
     def update(self, config_type, section, config, value):
         self._select_config(config_type).update(section, config, value)
 
-    def show(self, config_type, section, config, is_short, is_default):
-        if section == "*":  # top level wild card display
-            self._select_config(config_type).list(is_short, is_default)
-        elif config == "*": # second level wild card display
-            self._select_config(config_type).show_list(section, is_short, is_default)
-        else:
-            self._select_config(config_type).show(section, config, is_short, is_default)
+    def stage(self, config_type, section, config, value):
+        self._select_config(config_type).stage(section, config, value)
+
+    def discard(self):
+        for editor in self._editors.values():
+            editor.discard()
+
+    def commit(self):
+        for editor in self._editors.values():
+            editor.commit()
+
+    def update_batch(self, changes):
+        """
+        Validate all the changes first, then write each conf file at most once.
+        Nothing is written when any of the changes fails the validation.
+
+        Args:
+            changes: iterable of (config_type, section, config, value)
+        """
+        try:
+            for config_type, section, config, value in changes:
+                self.stage(config_type, section, config, value)
+        except Exception:
+            self.discard()
+            raise
+        self.commit()
+
+    def get(self, names, is_default=False):
+        """
+        Get the settings matching any of the names or glob patterns, see `schema.resolve`. The patterns
+        also match the settings of the conf files that are not in the schema, e.g. `wsl.user.*`.
+        Each conf file is only read once, whatever the number of names.
+
+        Returns:
+            a list of (config type, section, setting, value).
+        """
+        items = []
+        for config_type, section, config in resolve(
+                names, lambda config_type: self._select_config(config_type).get_config(is_default)):
+            items.extend(self._select_config(config_type).show(section, config, is_default))
+        return items
+
+    def show(self, names, is_short, is_default, output_format="text"):
+        sys.stdout.write(render(self.get(names, is_default), output_format, is_short))
 
     def reset(self, config_type, section, config):
         self._select_config(config_type).reset(section, config)
@@ -66,27 +139,121 @@ class SuperHandler:
         self.ubuntu_conf.reset_all()
         self.wsl_conf.reset_all()
 
-    def list_all(self, default):
-        self.ubuntu_conf.list(is_default=default)
-        self.wsl_conf.list(is_default=default)
+    def list(self, default=False):
+        """
+        Get all the settings, as a list of (config type, section, setting, value).
+        """
+        return self.ubuntu_conf.list(is_default=default) + self.wsl_conf.list(is_default=default)
+
+    def list_all(self, default, output_format="text"):
+        sys.stdout.write(render(self.list(default), output_format))
+
+    def export(self, sparse=False):
+        """
+        Get all the settings as `{type: {section: {setting: value}}}`, with the time of the export.
+
+        Args:
+            sparse: only get the settings that differ from their defaults, with the schema version
+                instead of the time of the export.
+        """
+        if sparse:
+            return {'schema_version': schema_version,
+                    'ubuntu': self.ubuntu_conf.get_changed(),
+                    'wsl': self.wsl_conf.get_changed()}
+        parsed_config = self.parsed_config
+        parsed_config['time_exported'] = timestamp()
+        return parsed_config
 
-    def export_file(self, name):
-        t = time.gmtime(time.time())
-        ts = "{}{:02d}{:02d}{:02d}{:02d}{:02d}UTC".format(t[0], t[1], t[2], t[3], t[4], t[5])
-        self.parsed_config['time_exported'] = ts
-        if name == "":
-            name = "exported_settings_{}.json".format(ts)
-        with open(name, 'w+') as f:
-            json.dump(self.parsed_config, f)
+    def export_file(self, name, sparse=False, output_format="json", compact=False):
+        """
+        Write the export to a file, see `export` and `formatter.write_export`.
 
-        return name
+        Returns:
+            the name of the file.
+        """
+        return write_export(self.export(sparse), name, output_format, compact)
 
-    def import_file(self, name):
-        with open(name, 'r+') as f:
-            file = json.load(f)
+    def diff(self, changes):
+        """
+        Tell which of the changes would change a setting. The changes are first compared with the
+        settings as loaded from the conf files, so that the unchanged ones are dropped whether they
+        are in the schema or not, e.g. `wsl.user.default` of a full export.
+
+        Args:
+            changes: iterable of (config_type, section, config, value)
+        Returns:
+            a list of (config type, section, setting, current value, new value), spelled as in the schema.
+        Raises:
+            KeyError: a setting that is not in the schema would change.
+        """
+        from configparser import ConfigParser
+        planned = {}
+        for config_type, section, config, value in changes:
+            loaded = self._select_config(config_type).get_config().get(section, {})
+            if value == loaded.get(ConfigParser.optionxform(None, config)):
+                try:
+                    planned.pop(canonical(config_type, section, config), None)
+                except KeyError:
+                    pass
+                continue
+            key = canonical(config_type, section, config)
+            current = self._select_config(key[0]).get_config()[key[1]][key[2]]
+            if value == current:
+                planned.pop(key, None)
+            else:
+                planned[key] = (current, value)
+        return [key + values for key, values in planned.items()]
+
+    def import_file(self, name, dry_run=False):
+        """
+        Import the settings from a file written by `export_file`, see `import_settings`.
+
+        Args:
+            name: the name of the file to import.
+            dry_run: only validate the changes, without applying them.
+        Returns:
+            the changes, see `diff`.
+        """
+        with open(name, 'r') as f:
+            file = parse_export(f.read())
+        return self.import_settings(file, dry_run)
+
+    def import_settings(self, exported, dry_run=False):
+        """
+        Import the settings of an export, see `export`. Only the settings that differ from the
+        current ones are validated and applied, writing each conf file at most once: importing
+        settings that match the current ones writes nothing. The keys other than the config types,
+        e.g. `time_exported`, are ignored.
+        A sparse export holds all the settings: the ones it leaves out are set back to their defaults.
+
+        Args:
+            exported: the export, as `{type: {section: {setting: value}}}` and metadata keys.
+            dry_run: only validate the changes, without applying them.
+        Returns:
+            the changes, see `diff`.
+        """
+        version = exported.get('schema_version')
+        assert version is None or int(version) <= schema_version, \
+            _("The settings are exported with the schema version {}, newer than the {} known to this "
+              "version of ubuntuwsl").format(version, schema_version)
+        imported = []
+        if version is not None:
             for i in ("ubuntu", "wsl"):
-                conf_to_read = file[i]
-                for j in conf_to_read.keys():
-                    j_tmp = conf_to_read[j]
-                    for k in j_tmp.keys():
-                        self.update(i, j, k, j_tmp[k])
+                for j, j_tmp in self._select_config(i).get_config(is_default=True).items():
+                    for k, value in j_tmp.items():
+                        imported.append((i, j, k, value))
+        for i in ("ubuntu", "wsl"):
+            for j, j_tmp in exported.get(i, {}).items():
+                for k, value in j_tmp.items():
+                    imported.append((i, j, k, value))
+        planned = self.diff(imported)
+        changes = [(i, j, k, new) for i, j, k, _current, new in planned]
+        if dry_run:
+            try:
+                for change in changes:
+                    self.stage(*change)
+            finally:
+                self.discard()
+        else:
+            self.update_batch(changes)
+        return planned
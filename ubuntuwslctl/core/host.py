@@ -0,0 +1,183 @@
+#    ubuntuwslctl.core.host - Windows host address detection
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import os
+import re
+
+from ubuntuwslctl.utils.i18n import translation
+
+_ = translation.gettext
+
+ROUTE_FILE = '/proc/net/route'
+RESOLV_CONF_FILE = '/etc/resolv.conf'
+BOOT_ID_FILE = '/proc/sys/kernel/random/boot_id'
+INTEROP_FILE = '/proc/sys/fs/binfmt_misc/WSLInterop'
+
+POWERSHELL_COMMAND = ['powershell.exe', '-noprofile', '-noninteractive', '-Command',
+                      'Get-WmiObject', '-class', 'win32_NetworkAdapterConfiguration']
+POWERSHELL_TIMEOUT = 10
+
+_RTF_GATEWAY = 0x2
+_IPV4 = re.compile(r"([0-9]{1,3}[.]){3}[0-9]{1,3}")
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def parse_route(content):
+    """
+    Find the default gateway in the content of `/proc/net/route`.
+
+    Returns:
+        the IPv4 address of the default gateway, or None when there is none.
+    """
+    for line in content.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+        destination, gateway, flags = fields[1], fields[2], fields[3]
+        try:
+            if destination == '00000000' and int(flags, 16) & _RTF_GATEWAY:
+                return '.'.join(str(i) for i in int(gateway, 16).to_bytes(4, 'little'))
+        except (ValueError, OverflowError):
+            continue
+    return None
+
+
+def parse_resolv_conf(content):
+    """
+    Find the first IPv4 nameserver in the content of `/etc/resolv.conf`.
+    """
+    for line in content.splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and fields[0] == 'nameserver' and _IPV4.fullmatch(fields[1]):
+            return fields[1]
+    return None
+
+
+def parse_powershell(content):
+    """
+    Find the IPv4 address of the first network adapter that has a default gateway
+    in the output of `Get-WmiObject -class win32_NetworkAdapterConfiguration`.
+    """
+    lines = content.splitlines()
+    for i, line in enumerate(lines):
+        if re.search(r"DefaultIPGateway.*: \{[0-9a-z]", line):
+            # IPAddress is listed within a few lines around DefaultIPGateway
+            for near in lines[max(i - 2, 0):i + 5]:
+                if 'IPAddress' in near:
+                    address = _IPV4.search(near)
+                    if address is not None:
+                        return address.group(0)
+            return None
+    return None
+
+
+def _cache_path():
+    """
+    Location of the cache of the PowerShell result, private to the current user.
+    """
+    import tempfile
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        cache_dir = os.path.join(runtime_dir, 'ubuntu-wsl')
+    else:
+        cache_dir = os.path.join(tempfile.gettempdir(), 'ubuntu-wsl-{}'.format(os.getuid()))
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    st = os.lstat(cache_dir)
+    if st.st_uid != os.getuid() or not os.path.isdir(cache_dir) or os.path.islink(cache_dir):
+        return None
+    return os.path.join(cache_dir, 'host')
+
+
+def from_route():
+    return parse_route(_read(ROUTE_FILE))
+
+
+def from_resolv_conf():
+    return parse_resolv_conf(_read(RESOLV_CONF_FILE))
+
+
+def from_powershell():
+    """
+    Ask Windows for the host address. This is slow, so the result is cached
+    until the next boot of the WSL instance.
+    """
+    import shutil
+    import subprocess
+    from ubuntuwslctl.utils.helper import atomic_write
+
+    boot_id = _read(BOOT_ID_FILE).strip()
+    try:
+        cache = _cache_path()
+    except OSError:
+        cache = None
+    if cache is not None:
+        cached = _read(cache).split()
+        if len(cached) == 2 and cached[0] == boot_id:
+            return cached[1]
+
+    if 'enabled' not in _read(INTEROP_FILE) or shutil.which(POWERSHELL_COMMAND[0]) is None:
+        return None
+    try:
+        output = subprocess.run(POWERSHELL_COMMAND, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=POWERSHELL_TIMEOUT, universal_newlines=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    address = parse_powershell(output)
+
+    if address is not None and cache is not None:
+        try:
+            atomic_write(cache, "{} {}\n".format(boot_id, address))
+        except OSError:
+            pass
+    return address
+
+
+strategies = {
+    'route': from_route,
+    'resolv': from_resolv_conf,
+    'powershell': from_powershell,
+}
+
+default_strategies = ('route', 'resolv', 'powershell')
+
+
+def detect_host(strategy_names=default_strategies):
+    """
+    Detect the address of the Windows host by trying the strategies in order.
+
+    Args:
+        strategy_names: names of the strategies in `strategies` to try.
+    Returns:
+        the address of the Windows host, or None when no strategy finds it.
+    """
+    for name in strategy_names:
+        assert name in strategies, _("Unknown host detection strategy `{}`").format(name)
+        address = strategies[name]()
+        if address:
+            return address
+    return None
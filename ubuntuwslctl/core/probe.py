@@ -0,0 +1,279 @@
+#    ubuntuwslctl.core.probe - X11 and PulseAudio reachability probes
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+X_TIMEOUT = 0.2
+PA_TIMEOUT = 0.3
+SCALING_TIMEOUT = 1
+
+X_PORT = 6000
+X_UNIX_SOCKET = '/tmp/.X11-unix/X{}'
+PA_PORT = 4713
+
+# X11 connection setup: LSB first, protocol 11.0, no authorization
+_X_SETUP = struct.pack('<cxHHHHxx', b'l', 11, 0, 0, 0)
+# the first byte of the 8-byte header of a setup reply: Failed, Success or Authenticate.
+# A server that refuses an unauthorized client still answers, so all of them tell a live server.
+_X_SETUP_REPLIES = (0, 1, 2)
+_X_SETUP_REPLY_LENGTH = 8
+
+# PulseAudio native protocol: a control packet with the AUTH command and an empty cookie.
+# A server requiring a cookie answers with ERROR, which tells a live server as well as REPLY.
+_PA_TAG_U32 = b'L'
+_PA_TAG_ARBITRARY = b'x'
+_PA_COMMAND_ERROR = 0
+_PA_COMMAND_REPLY = 2
+_PA_COMMAND_AUTH = 8
+_PA_PROTOCOL_VERSION = 32
+_PA_COOKIE_LENGTH = 256
+_PA_AUTH = (_PA_TAG_U32 + struct.pack('>L', _PA_COMMAND_AUTH) +
+            _PA_TAG_U32 + struct.pack('>L', 0) +
+            _PA_TAG_U32 + struct.pack('>L', _PA_PROTOCOL_VERSION) +
+            _PA_TAG_ARBITRARY + struct.pack('>L', _PA_COOKIE_LENGTH) + bytes(_PA_COOKIE_LENGTH))
+_PA_AUTH = struct.pack('>LLLLL', len(_PA_AUTH), 0xFFFFFFFF, 0, 0, 0) + _PA_AUTH
+_PA_DESCRIPTOR_LENGTH = 20
+
+
+def _connect(address, deadline):
+    """
+    Connect to a TCP `(host, port)` or to a Unix socket path before the deadline.
+
+    Returns:
+        the connected socket, or None if it cannot connect in time.
+    """
+    timeout = deadline - time.monotonic()
+    if timeout <= 0:
+        return None
+    try:
+        if isinstance(address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(address)
+            except OSError:
+                sock.close()
+                raise
+            return sock
+        return socket.create_connection(address, timeout=timeout)
+    except OSError:
+        return None
+
+
+def _exchange(sock, request, length, deadline):
+    """
+    Send a request and read the first `length` bytes of the answer before the deadline.
+
+    Returns:
+        the answer, or None when the peer does not answer in time.
+    """
+    answer = b''
+    try:
+        sock.settimeout(max(deadline - time.monotonic(), 0.001))
+        sock.sendall(request)
+        while len(answer) < length:
+            sock.settimeout(max(deadline - time.monotonic(), 0.001))
+            chunk = sock.recv(length - len(answer))
+            if not chunk:
+                return None
+            answer += chunk
+    except OSError:
+        return None
+    return answer
+
+
+def probe_x11_socket(host, timeout=X_TIMEOUT, display=0, handshake=True):
+    """
+    Whether an X server accepts connections, without spawning any X client.
+
+    Args:
+        host: the address of the X server. Empty for the local Unix socket.
+        timeout: deadline of the probe, in seconds.
+        display: the display number.
+        handshake: when True, require the X server to answer a connection setup, whether
+            it accepts it or asks for authorization, instead of only having the port open.
+    """
+    deadline = time.monotonic() + timeout
+    address = X_UNIX_SOCKET.format(display) if host in ("", "unix") else (host, X_PORT + display)
+    sock = _connect(address, deadline)
+    if sock is None:
+        return False
+    with sock:
+        if not handshake:
+            return True
+        answer = _exchange(sock, _X_SETUP, _X_SETUP_REPLY_LENGTH, deadline)
+        return answer is not None and answer[0] in _X_SETUP_REPLIES
+
+
+def probe_pulse_socket(host, timeout=PA_TIMEOUT, port=PA_PORT, handshake=True):
+    """
+    Whether a PulseAudio server accepts connections over TCP, without spawning `pactl`.
+
+    Args:
+        host: the address of the PulseAudio server.
+        timeout: deadline of the probe, in seconds.
+        port: the port of the PulseAudio server.
+        handshake: when True, require the PulseAudio server to answer an anonymous
+            authentication, whether it accepts it or not, instead of only having the port open.
+    """
+    deadline = time.monotonic() + timeout
+    sock = _connect((host, port), deadline)
+    if sock is None:
+        return False
+    with sock:
+        if not handshake:
+            return True
+        answer = _exchange(sock, _PA_AUTH, _PA_DESCRIPTOR_LENGTH + 5, deadline)
+        return answer is not None and answer[_PA_DESCRIPTOR_LENGTH:] in (
+            _PA_TAG_U32 + struct.pack('>L', _PA_COMMAND_REPLY), _PA_TAG_U32 + struct.pack('>L', _PA_COMMAND_ERROR))
+
+
+def _local_pulse_socket():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or "/run/user/{}".format(os.getuid())
+    return os.path.join(runtime_dir, 'pulse', 'native')
+
+
+def _run(command, timeout, env=None):
+    """
+    Run a command with a deadline.
+
+    Returns:
+        the standard output of the command, or None if it fails, times out or does not exist.
+    """
+    if shutil.which(command[0]) is None:
+        return None
+    if env is not None:
+        env = dict(os.environ, **env)
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env,
+                                timeout=timeout, universal_newlines=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def probe_x11_client(host, timeout=X_TIMEOUT, display=0):
+    """
+    Whether an X server on the host accepts connections, by running `xvinfo`.
+    """
+    return _run(['xvinfo'], timeout, {'DISPLAY': "{}:{}".format(host, display)}) is not None
+
+
+def probe_local_pulse(timeout=PA_TIMEOUT):
+    """
+    Whether there is a usable PulseAudio server inside WSL, i.e. one that does not only have the null sink.
+    `pactl` is only run when the socket of a local server exists, to look at its sinks.
+    """
+    sock = _connect(_local_pulse_socket(), time.monotonic() + timeout)
+    if sock is None:
+        return False
+    sock.close()
+    output = _run(['pactl', 'info'], timeout)
+    return output is not None and 'Default Sink: auto_null' not in output
+
+
+def probe_pulse_client(host, timeout=PA_TIMEOUT):
+    """
+    Whether a PulseAudio server on the host accepts connections over TCP, by running `pactl`.
+    """
+    return _run(['pactl', 'stat'], timeout, {'PULSE_SERVER': "tcp:{}".format(host)}) is not None
+
+
+def probe_scaling(timeout=SCALING_TIMEOUT):
+    """
+    The display scaling of Windows, or None when it is unknown.
+    """
+    output = _run(['wslsys', '-S', '-s'], timeout)
+    return output.strip() if output else None
+
+
+def probe_x11(host, timeout=X_TIMEOUT, use_clients=False):
+    """
+    Whether an X server on the host accepts connections.
+    With `use_clients`, `xvinfo` is tried as well when the socket probe fails.
+    """
+    if probe_x11_socket(host, timeout):
+        return True
+    return use_clients and probe_x11_client(host, timeout)
+
+
+def probe_remote_pulse(host, timeout=PA_TIMEOUT, use_clients=False):
+    """
+    Whether a PulseAudio server on the host accepts connections over TCP.
+    With `use_clients`, `pactl` is tried as well when the socket probe fails.
+    """
+    if probe_pulse_socket(host, timeout):
+        return True
+    return use_clients and probe_pulse_client(host, timeout)
+
+
+def _probe_gui(host, timeout, use_clients):
+    """
+    Probe the X server, then the display scaling only when the X server answers, as it is unused otherwise.
+
+    Returns:
+        whether the X server answers, and the display scaling or None.
+    """
+    if not probe_x11(host, timeout, use_clients):
+        return False, None
+    return True, probe_scaling()
+
+
+def probe_all(host, gui=True, audio=True, x_timeout=X_TIMEOUT, pa_timeout=PA_TIMEOUT, use_clients=False):
+    """
+    Run all the integration probes at the same time, so that the total time
+    is bounded by the slowest probe instead of the sum of all of them. The display
+    scaling is only queried once the X server answers.
+
+    Args:
+        host: the address of the Windows host.
+        gui: whether to probe for the X server.
+        audio: whether to probe for the PulseAudio server.
+        x_timeout: deadline of the X server probe, in seconds.
+        pa_timeout: deadline of each PulseAudio probe, in seconds.
+        use_clients: fall back to running `xvinfo` and `pactl` when the socket probes fail.
+    Returns:
+        a dict of the environment variables to export.
+    """
+    env = {}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        if gui:
+            x11 = pool.submit(_probe_gui, host, x_timeout, use_clients)
+        if audio:
+            local_pulse = pool.submit(probe_local_pulse, pa_timeout)
+            remote_pulse = pool.submit(probe_remote_pulse, host, pa_timeout, use_clients)
+
+        reachable, scaling = x11.result() if gui else (False, None)
+        if reachable:
+            env['DISPLAY'] = "{}:0".format(host)
+            env['LIBGL_ALWAYS_INDIRECT'] = "1"
+            if scaling is not None:
+                env['GDK_SCALE'] = scaling
+                env['QT_SCALE_FACTOR'] = scaling
+        if audio and not local_pulse.result() and remote_pulse.result():
+            env['PULSE_SERVER'] = "tcp:{}".format(host)
+    return env
@@ -0,0 +1,141 @@
+#    ubuntuwslctl.core.profile - store of named settings profiles
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+from ubuntuwslctl.utils.helper import atomic_write, timestamp
+from ubuntuwslctl.utils.i18n import translation
+
+_ = translation.gettext
+
+PROFILE_DIR = os.environ.get('UBUNTU_WSL_PROFILES') or '/var/lib/ubuntu-wsl/profiles'
+
+_FORMAT = 1
+
+
+def _content(exported):
+    """
+    The canonical content of a sparse export, so that the same settings always hash the same.
+    """
+    return json.dumps(exported, sort_keys=True, separators=(",", ":"))
+
+
+def digest(exported):
+    """
+    The hash a sparse export is stored under.
+    """
+    return hashlib.sha256(_content(exported).encode()).hexdigest()
+
+
+class ProfileStore:
+    """
+    Named profiles of the settings, stored as sparse exports (see `SuperHandler.export`).
+
+    The exports are stored once per content, as `objects/<sha256>.json`, so that profiles
+    saved from the same settings share it. `index.json` maps the names of the profiles to
+    their hash, so that listing and switching profiles only read the index.
+    """
+
+    def __init__(self, path=PROFILE_DIR):
+        self.path = path
+        self.index_path = os.path.join(path, "index.json")
+
+    def _object_path(self, key):
+        return os.path.join(self.path, "objects", key + ".json")
+
+    def index(self):
+        """
+        Get the profiles as `{name: {'hash': hash, 'saved': time}}`.
+        """
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)['profiles']
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, profiles):
+        atomic_write(self.index_path, json.dumps({'format': _FORMAT, 'profiles': profiles}, indent=2, sort_keys=True))
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the lock of the store while its index is read then written.
+        """
+        import fcntl
+        os.makedirs(os.path.join(self.path, "objects"), mode=0o755, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _get(self, profiles, name):
+        assert name in profiles, _("There is no profile named `{}`").format(name)
+        return profiles[name]['hash']
+
+    def save(self, name, exported):
+        """
+        Save a sparse export as a profile, replacing the profile of the same name.
+
+        Returns:
+            the hash of the profile.
+        """
+        assert name and "/" not in name and not name.startswith("."), _("Invalid profile name `{}`").format(name)
+        key = digest(exported)
+        with self._locked():
+            if not os.path.exists(self._object_path(key)):
+                atomic_write(self._object_path(key), _content(exported))
+            profiles = self.index()
+            old = profiles.get(name, {}).get('hash')
+            profiles[name] = {'hash': key, 'saved': timestamp()}
+            self._write_index(profiles)
+            if old is not None:
+                self._collect(profiles, old)
+        return key
+
+    def load(self, name):
+        """
+        Get the sparse export of a profile.
+        """
+        with open(self._object_path(self._get(self.index(), name)), 'r') as f:
+            return json.load(f)
+
+    def remove(self, name):
+        """
+        Remove a profile, and its stored export when no other profile uses it.
+        """
+        with self._locked():
+            profiles = self.index()
+            key = self._get(profiles, name)
+            del profiles[name]
+            self._write_index(profiles)
+            self._collect(profiles, key)
+
+    def _collect(self, profiles, key):
+        """
+        Delete a stored export once no profile uses it anymore.
+        """
+        if all(profile['hash'] != key for profile in profiles.values()):
+            try:
+                os.unlink(self._object_path(key))
+            except FileNotFoundError:
+                pass
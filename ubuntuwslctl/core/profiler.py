@@ -0,0 +1,146 @@
+#    ubuntuwslctl.core.profiler - render and input latency profiler of the TUI
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import json
+import os
+import time
+
+PERCENTILES = (50, 90, 99)
+
+
+def _percentile(ordered, percent):
+    """
+    The nearest-rank percentile of sorted values.
+    """
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
+def summarize(durations):
+    """
+    Summarize durations.
+
+    Args:
+        durations: the durations in seconds.
+    Returns:
+        the count, the total and the percentiles of the durations, in milliseconds.
+    """
+    ordered = sorted(durations)
+    summary = {'count': len(ordered), 'total_ms': round(sum(ordered) * 1000, 3)}
+    if ordered:
+        for percent in PERCENTILES:
+            summary['p{}_ms'.format(percent)] = round(_percentile(ordered, percent) * 1000, 3)
+        summary['max_ms'] = round(ordered[-1] * 1000, 3)
+    return summary
+
+
+class TuiProfiler:
+    """
+    Records where the time of the TUI goes, by wrapping the methods of a `Tui`, of its `urwid.MainLoop`
+    and of its screen:
+
+    - `body_build`: building the body, see `Tui._body_builder`;
+    - `widget_build`: building the widget of a row, as rows are built once they are shown;
+    - `frame`: drawing a frame, that is rendering the widgets to a canvas then writing it to the terminal;
+    - `terminal_output`: writing a canvas to the terminal, where the colors and the console weigh;
+    - `input_to_redraw`: from the time a batch of keys or mouse events is read to the end of the
+      next frame drawn.
+    """
+
+    def __init__(self):
+        self.durations = {name: [] for name in ('body_build', 'widget_build', 'frame', 'terminal_output',
+                                                'input_to_redraw')}
+        self._input_start = None
+        self._tui = None
+        self._size = None
+
+    def _timed(self, name, fun):
+        durations = self.durations[name]
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                durations.append(time.perf_counter() - start)
+        return timed
+
+    def attach(self, tui):
+        """
+        Wrap the build of the body of a `Tui`. To be called before the body is built.
+        """
+        self._tui = tui
+        tui._body_builder = self._timed('body_build', tui._body_builder)
+        tui._row = self._timed('widget_build', tui._row)
+
+    def attach_loop(self, loop):
+        """
+        Wrap the input and the drawing of the main loop of the `Tui`.
+        """
+        process_input = loop.process_input
+        draw_screen = self._timed('frame', loop.draw_screen)
+
+        def profiled_process_input(keys):
+            if self._input_start is None:
+                self._input_start = time.perf_counter()
+            return process_input(keys)
+
+        def profiled_draw_screen():
+            draw_screen()
+            self._size = loop.screen_size
+            if self._input_start is not None:
+                self.durations['input_to_redraw'].append(time.perf_counter() - self._input_start)
+                self._input_start = None
+
+        loop.process_input = profiled_process_input
+        loop.draw_screen = profiled_draw_screen
+        loop.screen.draw_screen = self._timed('terminal_output', loop.screen.draw_screen)
+
+    def summary(self):
+        """
+        The summary of the profile, with what the latency depends on: the terminal, its colors and its size.
+        """
+        result = {
+            'term': os.environ.get('TERM', ""),
+            'windows_terminal': "WT_SESSION" in os.environ,
+            'colors': self._tui.screen.colors,
+            'size': list(self._size) if self._size else None,
+            'rows': len(self._tui.rows),
+        }
+        for name, durations in self.durations.items():
+            result[name] = summarize(durations)
+        return result
+
+    def write(self, name):
+        """
+        Write the summary as a json file.
+
+        Args:
+            name: the name of the file, or "" for a name from the current time.
+        Returns:
+            the name of the file.
+        """
+        if name == "":
+            from ubuntuwslctl.utils.helper import timestamp
+            name = "ubuntuwsl_tui_profile_{}.json".format(timestamp())
+        with open(name, 'w+') as f:
+            json.dump(self.summary(), f, indent=2)
+
+        return name
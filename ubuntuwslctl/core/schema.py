@@ -0,0 +1,255 @@
+#    ubuntuwslctl.core.schema - index of the setting keys
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+from functools import lru_cache
+
+from ubuntuwslctl.core.default import conf_def
+
+_GLOB_CHARS = "*?["
+
+
+def _build_keys():
+    keys = []
+    for config_type, sections in conf_def.items():
+        for section, settings in sections.items():
+            if section.startswith('_'):
+                continue
+            for setting in settings:
+                if not setting.startswith('_'):
+                    keys.append((config_type, section, setting))
+    return tuple(keys)
+
+
+def _build_key_index():
+    index = {}
+    short_names = {}
+    for key in keys:
+        index[".".join(key).lower()] = key
+        short_names.setdefault(".".join(key[1:]).lower(), []).append(key)
+    # the type can only be omitted when no other type has the same section and setting
+    index.update({name: found[0] for name, found in short_names.items() if len(found) == 1})
+    return index
+
+
+# every (config type, section, setting) of the schema, in the order of `conf_def`
+keys = _build_keys()
+
+# the spec of every key in `conf_def`
+specs = {key: conf_def[key[0]][key[1]][key[2]] for key in keys}
+
+# keys by every accepted spelling of their name, i.e. `type.section.setting` or `section.setting`, in lower case
+key_index = _build_key_index()
+
+# sections by `type.section` in lower case
+section_index = {"{}.{}".format(key[0], key[1]).lower(): conf_def[key[0]][key[1]] for key in keys}
+
+_full_names = tuple((".".join(key).lower(), key) for key in keys)
+_short_names = tuple((".".join(key[1:]).lower(), key) for key in keys)
+
+
+def lookup(name):
+    """
+    Find the key of a setting by its name, whatever its case.
+
+    Args:
+        name: `type.section.setting`, or `section.setting`.
+    Returns:
+        the key as (config type, section, setting), spelled as in the schema.
+    Raises:
+        KeyError: when the setting is not in the schema.
+    """
+    key = key_index.get(name.lower())
+    if key is None:
+        raise KeyError(name)
+    return key
+
+
+def canonical(config_type, section, setting):
+    """
+    Spell the key of a setting as in the schema, see `lookup`.
+    """
+    return lookup(".".join((config_type, section, setting)))
+
+
+def spec(config_type, section, setting):
+    """
+    The spec of a setting whatever the case of its name, or None when it is not in the schema.
+    """
+    key = key_index.get(".".join((config_type, section, setting)).lower())
+    return None if key is None else specs[key]
+
+
+def section_spec(config_type, section):
+    """
+    The spec of a section whatever the case of its name, or None when it is not in the schema.
+    """
+    return section_index.get("{}.{}".format(config_type, section).lower())
+
+
+def _loaded_keys(config_types, loaded):
+    """
+    The keys of the settings only found in the conf files, e.g. `wsl.user.default`.
+
+    Args:
+        config_types: the config types to look into.
+        loaded: a function giving the sections of a config type as `{section: {setting: value}}`.
+    """
+    found = []
+    for config_type in config_types:
+        for section, settings in loaded(config_type).items():
+            for setting in settings:
+                key = (config_type, section, setting)
+                if ".".join(key).lower() not in key_index:
+                    found.append(key)
+    return found
+
+
+def _match_short(pattern, candidates):
+    """
+    Match a `section.setting` pattern. The sections spelled with the same case as the pattern are
+    preferred, e.g. `Interop.*` is `ubuntu.Interop.*` and not `wsl.interop.*`. Otherwise the case is
+    ignored, but as in `key_index`, only for the names that do not belong to several types.
+    """
+    from fnmatch import fnmatchcase
+    section, setting = pattern.split(".")
+    setting = setting.lower()
+    exact = [key for key in candidates if fnmatchcase(key[1], section) and fnmatchcase(key[2].lower(), setting)]
+    if exact:
+        return exact
+    found = {}
+    lowered = pattern.lower()
+    for key in candidates:
+        name = ".".join(key[1:]).lower()
+        if fnmatchcase(name, lowered):
+            found.setdefault(name, []).append(key)
+    return [keys_found[0] for keys_found in found.values() if len(keys_found) == 1]
+
+
+def match(pattern, loaded=None):
+    """
+    Find the keys a name or a glob pattern refers to, whatever its case.
+
+    A pattern of three parts is matched against `type.section.setting`, one of two parts against
+    `section.setting`, except for `type.*` which stands for every setting of the type.
+    A section spelled with the same case is preferred, see `_match_short`.
+    A full `type.section.setting` name that is not in the schema is kept as it is,
+    so that settings only found in the conf files can still be shown.
+
+    Args:
+        pattern: the name or the glob pattern.
+        loaded: a function giving the sections of a config type as loaded from its conf file,
+            so that the patterns also match the settings that are not in the schema, e.g. `[user]`
+            in wsl.conf. It is only called for the config types a pattern may refer to.
+    Returns:
+        the list of the matching keys, in the order of the schema then of the conf files.
+    """
+    lowered = pattern.lower()
+    parts = lowered.split(".")
+    if not any(c in pattern for c in _GLOB_CHARS):
+        key = key_index.get(lowered)
+        if key is not None:
+            return [key]
+        parts = pattern.split(".")
+        if len(parts) == 3 and parts[0].lower() in conf_def and all(parts):
+            return [(parts[0].lower(), parts[1], parts[2])]
+        if len(parts) != 2:
+            return []
+        parts = lowered.split(".")
+    from fnmatch import fnmatchcase
+    if len(parts) == 2 and parts[0] in conf_def and parts[1] == "*":
+        lowered += ".*"
+        parts.append("*")
+    config_types = [parts[0]] if len(parts) == 3 and parts[0] in conf_def else list(conf_def)
+    candidates = keys + tuple(_loaded_keys(config_types, loaded)) if loaded is not None else keys
+    if len(parts) == 2:
+        return _match_short(pattern, candidates)
+    return [key for key in candidates if fnmatchcase(".".join(key).lower(), lowered)]
+
+
+def resolve(patterns, loaded=None):
+    """
+    Resolve names and glob patterns to the keys they refer to.
+
+    Args:
+        patterns: the names and glob patterns, e.g. `wsl.*.enabled` or `*.Interop.*`.
+        loaded: a function giving the sections of a config type as loaded from its conf file, see `match`.
+    Returns:
+        the list of the keys, in the order of the patterns and without duplicates.
+    Raises:
+        KeyError: when a pattern does not refer to any key.
+    """
+    resolved = {}
+    for pattern in patterns:
+        matched = match(pattern, loaded)
+        if not matched:
+            raise KeyError(pattern)
+        for key in matched:
+            resolved.setdefault(key)
+    return list(resolved)
+
+
+def _tokens(text):
+    import re
+    return re.findall(r"[0-9a-z]+", text.lower())
+
+
+@lru_cache(maxsize=None)
+def search_index():
+    """
+    The words of every setting, i.e. of its name, its friendly name, the friendly names of
+    its section and type, and its tooltip.
+
+    Returns:
+        the sorted list of the words, and the keys of the settings by word.
+    """
+    index = {}
+    for key in keys:
+        texts = (".".join(key), conf_def[key[0]]['_friendly_name'], conf_def[key[0]][key[1]]['_friendly_name'],
+                 specs[key]['_friendly_name'], specs[key]['tip'])
+        for token in _tokens(" ".join(texts)):
+            index.setdefault(token, set()).add(key)
+    return sorted(index), index
+
+
+@lru_cache(maxsize=1024)
+def _search_word(word):
+    from bisect import bisect_left
+    tokens, index = search_index()
+    found = set()
+    for position in range(bisect_left(tokens, word), len(tokens)):
+        if not tokens[position].startswith(word):
+            break
+        found |= index[tokens[position]]
+    return frozenset(found)
+
+
+def search(query):
+    """
+    Find the settings having a word starting with each word of the query, in their name,
+    friendly name, section, type or tooltip.
+
+    Returns:
+        the set of the matching keys; every key when the query has no word.
+    """
+    words = _tokens(query)
+    if not words:
+        return frozenset(keys)
+    return frozenset.intersection(*(_search_word(word) for word in words))
@@ -0,0 +1,158 @@
+#    ubuntuwslctl.core.server - the ubuntuwsl serve daemon
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+
+from ubuntuwslctl.core.client import Client, SOCKET_PATH
+from ubuntuwslctl.core.handler import SuperHandler
+from ubuntuwslctl.utils.i18n import translation
+
+_ = translation.gettext
+
+_UCRED = struct.Struct('3i')
+
+
+def _peer_uid(sock):
+    """
+    The user id of the process on the other end of a Unix socket.
+    """
+    _pid, uid, _gid = _UCRED.unpack(sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _UCRED.size))
+    return uid
+
+
+class Daemon:
+    """
+    Answers the requests of `Client`, from configs kept in memory. A conf file is read
+    again once it changes on disk, and the requests are run one at a time so that
+    writes never interleave.
+    """
+
+    def __init__(self):
+        self.handler = SuperHandler()
+        self.lock = threading.Lock()
+        self._ops = {
+            'get': self.op_get,
+            'list': self.op_list,
+            'set': self.op_set,
+            'export': self.op_export,
+        }
+
+    def op_get(self, request, uid):
+        return {'items': self.handler.get(request['names'], request.get('default', False))}
+
+    def op_list(self, request, uid):
+        return {'items': self.handler.list(request.get('default', False))}
+
+    def op_set(self, request, uid):
+        if uid != 0:
+            raise PermissionError(_("You need to have root privileges to change the settings"))
+        self.handler.update_batch(tuple(change) for change in request['changes'])
+        return {}
+
+    def op_export(self, request, uid):
+        # copied, as the answer is encoded once the lock is released
+        return {'config': {key: {s: dict(v) for s, v in value.items()} if isinstance(value, dict) else value
+                           for key, value in self.handler.export(request.get('sparse', False)).items()}}
+
+    def dispatch(self, request, uid):
+        """
+        Run a request.
+
+        Args:
+            request: the decoded request.
+            uid: the user id of the client.
+        Returns:
+            the answer to send back.
+        """
+        if not isinstance(request, dict) or request.get('op') not in self._ops:
+            return {'ok': False, 'error': 'BadRequest', 'message': _("Unknown request")}
+        try:
+            with self.lock:
+                self.handler.invalidate()
+                answer = self._ops[request['op']](request, uid)
+        except KeyError as e:
+            return {'ok': False, 'error': 'KeyError', 'message': str(e.args[0]) if e.args else ""}
+        except AssertionError as e:
+            return {'ok': False, 'error': 'ValidationError', 'message': str(e)}
+        except PermissionError as e:
+            return {'ok': False, 'error': 'PermissionError', 'message': str(e)}
+        except OSError as e:
+            # e.g. the disk is full: the configs are left as in the conf files, see `ConfigEditor._rollback`
+            return {'ok': False, 'error': 'OSError', 'message': str(e)}
+        except (TypeError, ValueError) as e:
+            return {'ok': False, 'error': 'BadRequest', 'message': str(e)}
+        answer['ok'] = True
+        return answer
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        uid = _peer_uid(self.request)
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            answer = self.server.daemon.dispatch(request, uid)
+            self.wfile.write(json.dumps(answer).encode() + b"\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, daemon):
+        self.daemon = daemon
+        socketserver.UnixStreamServer.__init__(self, path, _RequestHandler)
+
+
+def serve(path=SOCKET_PATH):
+    """
+    Run the daemon on a Unix socket until it is interrupted or terminated.
+    Everybody can query the settings, only root can change them.
+
+    Args:
+        path: the location of the socket.
+    """
+    if os.path.exists(path):
+        client = Client.connect(path)
+        if client is not None:
+            client.close()
+        assert client is None, _("ubuntuwsl serve is already running on {}").format(path)
+        os.unlink(path)  # left behind by a daemon that did not stop cleanly
+    os.makedirs(os.path.dirname(path), mode=0o755, exist_ok=True)
+
+    server = _Server(path, Daemon())
+    os.chmod(path, 0o666)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -0,0 +1,87 @@
+#    ubuntuwslctl.core.validator - validators for conf values
+#    Copyright (C) 2021 Canonical Ltd.
+#    Copyright (C) 2021 Patrick Wu
+#
+#    Authors: Patrick Wu <patrick.wu@canonical.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This package is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#  On Debian systems, the complete text of the GNU General
+#  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import re
+from functools import lru_cache
+
+from ubuntuwslctl.core.default import type_def
+from ubuntuwslctl.utils.i18n import N_, translation
+
+_ = translation.gettext
+
+
+class TypeValidator:
+    def __init__(self, spec):
+        """
+        Validator for one of the types in `type_def`. The pattern is compiled only once.
+
+        Args:
+            spec: the type definition from `type_def`.
+        """
+        pattern = spec['pattern']
+        if not isinstance(pattern, str):
+            pattern = '|'.join(pattern)
+        self._match = re.compile(pattern).fullmatch
+        self.separator = spec.get('separator')
+        self.hint = spec['hint']
+        self.item_hint = spec.get('item_hint', N_("{} is not valid; "))
+        self.empty_item_hint = spec.get('empty_item_hint', N_("an empty entry detected; "))
+
+    def __call__(self, input_con):
+        if self.separator is None:
+            return self._match(input_con) is not None, _(self.hint)
+
+        if input_con == "":
+            return True, ""
+        x = True
+        e_t = ""
+        for i in input_con.split(self.separator):
+            if i == "":
+                e_t += _(self.empty_item_hint)
+                x = False
+            elif self._match(i) is None:
+                e_t += _(self.item_hint).format(i)
+                x = False
+        return x, _(self.hint).format(e_t)
+
+
+_validators = {}
+
+
+def get_validator(type_name):
+    """
+    Get the validator of a type, building it on first use.
+    """
+    if type_name not in _validators:
+        assert type_name in type_def, _("Unknown type `{}` to be validated.").format(type_name)
+        _validators[type_name] = TypeValidator(type_def[type_name])
+    return _validators[type_name]
+
+
+@lru_cache(maxsize=1024)
+def validate(type_name, input_con):
+    """
+    Validate a value against a type. Results are memoized.
+
+    Returns:
+        a tuple of whether the value is valid, and the hint to show when it is not.
+    """
+    return get_validator(type_name)(input_con)
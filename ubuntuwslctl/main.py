@@ -21,37 +21,83 @@
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
 
 import sys
-from argparse import ArgumentParser, RawTextHelpFormatter
 
-from ubuntuwslctl.utils.helper import config_name_extractor, query_yes_no, bcolors
+from ubuntuwslctl.utils.helper import config_assignment_extractor, query_yes_no, bcolors
 from ubuntuwslctl.utils.i18n import translation
-from ubuntuwslctl.core.handler import SuperHandler
 
 _ = translation.gettext
 
+VERSION = "0.28.0"
+
 
 class Application:
-    def __init__(self):
-        self.handler = SuperHandler()
-        self.parser = ArgumentParser(
-            formatter_class=RawTextHelpFormatter,
-            description=_("ubuntuwsl is a tool for help manage your settings for Ubuntu WSL."),
-            epilog=_("Note: \"Super Experimental\" means it is WIP and not working. "
-                     "\"Experimental\" means it is WIP but most of the part is working."))
-        self._init_parser()
-        self._args = self.parser.parse_args()
+    # command: (aliases, the method that adds its subparser)
+    _commands = {
+        "help": (["?"], "_add_help_cmd"),
+        "update": (["up"], "_add_update_cmd"),
+        "reset": (["rs", "rm"], "_add_reset_cmd"),
+        "show": (["cat"], "_add_show_cmd"),
+        "list": (["ls"], "_add_list_cmd"),
+        "visual": (["ui", "tui"], "_add_visual_cmd"),
+        "export": (["out"], "_add_export_cmd"),
+        "import": (["in"], "_add_import_cmd"),
+        "host": ([], "_add_host_cmd"),
+        "probe": ([], "_add_probe_cmd"),
+        "serve": ([], "_add_serve_cmd"),
+        "profile": ([], "_add_profile_cmd"),
+        "fun": ([], "_add_fun_cmd"),
+    }
+
+    def __init__(self, argv=None):
+        self._handler = None
+        argv = sys.argv[1:] if argv is None else argv
+        self.parser = self._build_parser(self._command_name(self._first_command(argv)))
+        self._args = self.parser.parse_args(argv)
+
+    @property
+    def handler(self):
+        """
+        The handler is only built once a command needs it, so that `--version`,
+        `help` and argument errors never touch the conf files.
+        """
+        if self._handler is None:
+            from ubuntuwslctl.core.handler import SuperHandler
+            self._handler = SuperHandler()
+        return self._handler
+
+    @property
+    def backend(self):
+        """
+        The client of `ubuntuwsl serve` when it runs, so that queries are answered without
+        reading the conf files; the handler otherwise.
+        """
+        if not self._args.no_daemon:
+            from ubuntuwslctl.core.client import Client
+            client = Client.connect()
+            if client is not None:
+                return client
+        return self.handler
 
     def run(self):
         try:
             self._args.func()
-        except KeyError:
+        except KeyError as e:
+            # the name that is unknown when known, all the names passed otherwise
+            name = e.args[0] if e.args and isinstance(e.args[0], str) else self._args.name
+            if isinstance(name, list):
+                name = " ".join(name)
             print(bcolors.FAIL + _("KeyError: ") + bcolors.ENDC +
-                  _("Unknown key name `{name}` passed. Aborting.").format(name=self._args.name))
+                  _("Unknown key name `{name}` passed. Aborting.").format(name=name))
             sys.exit(1)
         except AssertionError as e:
             print(bcolors.FAIL + _("ValidationError: ") + bcolors.ENDC +
                   _("{error}. Aborting.").format(error=e))
             sys.exit(1)
+        except ConnectionError as e:
+            print(bcolors.FAIL + _("ConnectionError: ") + bcolors.ENDC +
+                  _("{error}. Pass --no-daemon to read the conf files without `ubuntuwsl serve`. "
+                    "Aborting.").format(error=e))
+            sys.exit(1)
         except IOError:
             print(bcolors.FAIL + _("IOError: ") + bcolors.ENDC +
                   _("There is an error whe trying to read/write the conf file. "
@@ -63,18 +109,63 @@ class Application:
             raise
             sys.exit(1)
 
-    def _init_parser(self):
-        self.parser.add_argument(
-            '--version', action='version', version="ubuntuwsl 0.28.0")
-        self.parser.set_defaults(func=self.do_help)
-        self.parser.add_argument(
+    @staticmethod
+    def _first_command(argv):
+        for arg in argv:
+            if not arg.startswith("-"):
+                return arg
+        return None
+
+    def _command_name(self, command):
+        """
+        Resolve a command or one of its aliases to the command name, or None if it is unknown.
+        """
+        for name, (aliases, _builder) in self._commands.items():
+            if command == name or command in aliases:
+                return name
+        return None
+
+    def _build_parser(self, command=None):
+        """
+        Build the parser. Only the subparser of `command` is added when it is given,
+        so that a run does not pay for building every other command.
+
+        Args:
+            command: the name of the command to build the subparser of; None for all of them.
+        """
+        from argparse import ArgumentParser, RawTextHelpFormatter
+        parser = ArgumentParser(
+            formatter_class=RawTextHelpFormatter,
+            description=_("ubuntuwsl is a tool for help manage your settings for Ubuntu WSL."),
+            epilog=_("Note: \"Super Experimental\" means it is WIP and not working. "
+                     "\"Experimental\" means it is WIP but most of the part is working."))
+        parser.add_argument(
+            '--version', action='version', version="ubuntuwsl " + VERSION)
+        parser.set_defaults(func=self.do_help)
+        parser.add_argument(
             "-y", "--yes", action="store_true",
             help=_("When passed, always assume yes."), required=False)
-        # self.parser.add_argument(
+        parser.add_argument(
+            "--no-daemon", action="store_true",
+            help=_("When passed, read the conf files even if `ubuntuwsl serve` is running."), required=False)
+        # parser.add_argument(
         #     "-c", "--config", type=str, choices=["ubuntu", "wsl", "both"], default="both",
         #     help=_("When passed, handling ubuntu-wsl.conf only."), required=False)
-        commands = self.parser.add_subparsers(title=_("commands"))
+        commands = parser.add_subparsers(title=_("commands"))
+        for name, (_aliases, builder) in self._commands.items():
+            if command is None or command == name:
+                getattr(self, builder)(commands)
+        return parser
 
+    @staticmethod
+    def _add_format_argument(cmd):
+        from ubuntuwslctl.core.formatter import formats
+        cmd.add_argument(
+            "-f", "--format", choices=formats, default="text",
+            help=_("The output format: `text` for humans, `json` with typed values, `env` "
+                   "for shell `eval`, `ini` as conf files, and `tsv` as tab-separated values."))
+
+    def _add_help_cmd(self, commands):
         help_cmd = commands.add_parser(
             "help", aliases=["?"],
             description=_(
@@ -89,22 +180,24 @@ class Application:
         )
         help_cmd.set_defaults(func=self.do_help)
 
+    def _add_update_cmd(self, commands):
         update_cmd = commands.add_parser(
             "update", aliases=["up"],
             description=_(
                 "Change the value of a WSL or Ubuntu configuration "
-                "settings. "),
-            help=_("Change the state of a specific setting"))
-        update_cmd.add_argument(
-            "name",
-            help=_("The name of the configuration to be updated")
-        )
+                "settings. Either pass a name and a value, or one or more "
+                "name=value pairs. Pass `-` to read name=value pairs "
+                "line by line from the standard input. "
+                "All changes are validated before any file is written."),
+            help=_("Change the state of one or more settings"))
         update_cmd.add_argument(
-            "value",
-            help=_("The value you want to set for this configuration")
+            "name", nargs="+", metavar="name=value",
+            help=_("The configuration to be updated and the value you want to set, "
+                   "or `-` to read from the standard input")
         )
         update_cmd.set_defaults(func=self.do_update)
 
+    def _add_reset_cmd(self, commands):
         reset_cmd = commands.add_parser(
             "reset", aliases=["rs", "rm"],
             description=_(
@@ -119,14 +212,17 @@ class Application:
         )
         reset_cmd.set_defaults(func=self.do_reset)
 
+    def _add_show_cmd(self, commands):
         show_cmd = commands.add_parser(
             "show", aliases=["cat"],
             description=_(
-                "Display the specified stored configuration."),
+                "Display the specified stored configuration. Several names can be "
+                "given at once, as well as glob patterns such as `wsl.*.enabled` "
+                "or `*.Interop.*`."),
             help=_("Show the specified stored configuration"))
         show_cmd.add_argument(
-            "name",
-            help=_("The name of the configurations")
+            "name", nargs="+",
+            help=_("The names or glob patterns of the configurations")
         )
         show_cmd.add_argument(
             "-s", "--short", action="store_true",
@@ -135,8 +231,10 @@ class Application:
             "-d", "--default", action="store_true",
             help=_("Show the default configuration settings instead of current "
                    "user-defined ones."))
+        self._add_format_argument(show_cmd)
         show_cmd.set_defaults(func=self.do_show)
 
+    def _add_list_cmd(self, commands):
         ls_cmd = commands.add_parser(
             "list", aliases=["ls"],
             description=_("List all configurations."),
@@ -145,14 +243,26 @@ class Application:
             "-d", "--default", action="store_true",
             help=_("Show the default configuration settings instead of current "
                    "user-defined ones."))
+        self._add_format_argument(ls_cmd)
         ls_cmd.set_defaults(func=self.do_list)
 
+    def _add_visual_cmd(self, commands):
         ui_cmd = commands.add_parser(
             "visual", aliases=["ui", "tui"],
             description=_("Display a friendly text-based user interface. (Experimental)"),
             help=_("Display a friendly text-based user interface. (Experimental)"))
+        ui_cmd.add_argument(
+            "--color-fallback", action="store_true",
+            help=_("Use 16 colors instead of true colors."))
+        ui_cmd.add_argument(
+            "--profile", nargs="?", const="", metavar="FILE",
+            help=_("Record the render time of the frames, the latency from a key press to the redraw "
+                   "and the build time of the widgets, and write their percentiles to a json file "
+                   "on exit."))
         ui_cmd.set_defaults(func=self.do_ui)
 
+    def _add_export_cmd(self, commands):
+        from ubuntuwslctl.core.formatter import export_formats
         export_cmd = commands.add_parser(
             "export", aliases=["out"],
             description=_("Export the settings (Experimental)"),
@@ -160,35 +270,144 @@ class Application:
         export_cmd.add_argument(
             "file", nargs="?", default="",
             help=_("the name of the file to export."))
+        export_cmd.add_argument(
+            "-s", "--sparse", action="store_true",
+            help=_("Only export the settings that differ from their defaults, with the schema version."))
+        export_cmd.add_argument(
+            "-f", "--format", choices=export_formats, default="json",
+            help=_("The format of the file. Default: json"))
+        export_cmd.add_argument(
+            "--compact", action="store_true",
+            help=_("Leave out the optional whitespace."))
         export_cmd.set_defaults(func=self.do_export)
 
+    def _add_import_cmd(self, commands):
         import_cmd = commands.add_parser(
             "import", aliases=["in"],
-            description=_("Import settings (Experimental)"),
+            description=_("Import settings. Only the settings that differ from the current ones are "
+                          "written. (Experimental)"),
             help=_("Import settings from a json file (Experimental)"))
         import_cmd.add_argument(
             "file",
             help=_("the name of the file to export."))
+        import_cmd.add_argument(
+            "-n", "--dry-run", action="store_true",
+            help=_("Print the settings that would change, without changing them."))
         import_cmd.set_defaults(func=self.do_import)
 
+    def _add_host_cmd(self, commands):
+        host_cmd = commands.add_parser(
+            "host",
+            description=_("Detect the address of the Windows host. Strategies are tried in order: "
+                          "`route` uses the default gateway, `resolv` uses the nameserver in "
+                          "/etc/resolv.conf, and `powershell` asks Windows and caches the answer "
+                          "until the next boot."),
+            help=_("Detect the address of the Windows host"))
+        host_cmd.add_argument(
+            "-S", "--strategy", default="route,resolv,powershell",
+            help=_("Comma-separated list of the detection strategies to try. "
+                   "Default: route,resolv,powershell"))
+        host_cmd.set_defaults(func=self.do_host)
+
+    def _add_probe_cmd(self, commands):
+        probe_cmd = commands.add_parser(
+            "probe",
+            description=_("Probe the X server and the PulseAudio server on the Windows host at the "
+                          "same time, and print the environment variables to use them as "
+                          "shell `export` lines. When neither --gui nor --audio is passed, "
+                          "the integrations enabled in ubuntu-wsl.conf are probed."),
+            help=_("Probe the GUI and audio integrations"))
+        probe_cmd.add_argument(
+            "--host",
+            help=_("The address of the Windows host. Detected when not passed, see `ubuntuwsl host`."))
+        probe_cmd.add_argument(
+            "-S", "--strategy", default="route,resolv,powershell",
+            help=_("Comma-separated list of the strategies to detect the Windows host with, when --host "
+                   "is not passed. Default: route,resolv,powershell"))
+        probe_cmd.add_argument(
+            "--gui", action="store_true",
+            help=_("Probe the X server."))
+        probe_cmd.add_argument(
+            "--audio", action="store_true",
+            help=_("Probe the PulseAudio server."))
+        probe_cmd.add_argument(
+            "--x-timeout", type=float, default=0.2,
+            help=_("Deadline of the X server probe in seconds."))
+        probe_cmd.add_argument(
+            "--pa-timeout", type=float, default=0.3,
+            help=_("Deadline of the PulseAudio probes in seconds."))
+        probe_cmd.add_argument(
+            "--use-clients", action="store_true",
+            help=_("Also run xvinfo and pactl when a server does not answer on its socket."))
+        probe_cmd.set_defaults(func=self.do_probe)
+
+    def _add_serve_cmd(self, commands):
+        from ubuntuwslctl.core.client import SOCKET_PATH
+        serve_cmd = commands.add_parser(
+            "serve",
+            description=_("Run a daemon keeping the settings in memory, answering the queries of "
+                          "`show`, `list`, `update` and `export` over a Unix socket. Only root can "
+                          "change the settings through it. (Experimental)"),
+            help=_("Run a daemon answering queries on the settings (Experimental)"))
+        serve_cmd.add_argument(
+            "--socket", default=SOCKET_PATH,
+            help=_("The location of the socket. Default: {}").format(SOCKET_PATH))
+        serve_cmd.set_defaults(func=self.do_serve)
+
+    def _add_profile_cmd(self, commands):
+        from ubuntuwslctl.core.profile import PROFILE_DIR
+        profile_cmd = commands.add_parser(
+            "profile",
+            description=_("Manage named profiles of the settings, stored as sparse exports in {}. "
+                          "Profiles with the same settings are stored once. (Experimental)").format(PROFILE_DIR),
+            help=_("Save and switch between named profiles of the settings (Experimental)"))
+        profile_cmd.set_defaults(func=self.do_profile_list)
+        actions = profile_cmd.add_subparsers(title=_("actions"))
+        save_cmd = actions.add_parser(
+            "save",
+            help=_("Save the current settings as a profile, replacing the profile of the same name."))
+        save_cmd.add_argument("name", help=_("the name of the profile."))
+        save_cmd.set_defaults(func=self.do_profile_save)
+        list_cmd = actions.add_parser(
+            "list", aliases=["ls"],
+            help=_("List the profiles. The profile matching the current settings is marked with `*`."))
+        list_cmd.set_defaults(func=self.do_profile_list)
+        use_cmd = actions.add_parser(
+            "use",
+            help=_("Apply a profile: the settings it leaves out are set back to their defaults."))
+        use_cmd.add_argument("name", help=_("the name of the profile."))
+        use_cmd.add_argument(
+            "-n", "--dry-run", action="store_true",
+            help=_("Print the settings that would change, without changing them."))
+        use_cmd.set_defaults(func=self.do_profile_use)
+        rm_cmd = actions.add_parser(
+            "rm", aliases=["remove"],
+            help=_("Remove a profile."))
+        rm_cmd.add_argument("name", help=_("the name of the profile."))
+        rm_cmd.set_defaults(func=self.do_profile_rm)
+
+    def _add_fun_cmd(self, commands):
         fun_cmd = commands.add_parser("fun")
         fun_cmd.set_defaults(func=self.do_fun)
 
     def do_help(self):
         if 'cmd' in self._args and self._args.cmd is not None:
+            self.parser = self._build_parser(self._command_name(self._args.cmd))
             self.parser.parse_args([self._args.cmd, '-h'])
         else:
+            self.parser = self._build_parser()
             self.parser.parse_args(['-h'])
 
     def do_list(self):
-        self.handler.list_all(self._args.default)
+        self.backend.list_all(self._args.default, self._args.format)
 
     def do_reset(self):
         print(bcolors.WARNING + _("WARNING: ") + bcolors.ENDC +
               _("you need to restart Ubuntu distribution to take effect."))
         assume_yes = 'yes' in self._args and self._args.yes
         if 'name' in self._args and self._args.name is not None:
-            config_type, config_section, config_setting = config_name_extractor(self._args.name)
+            from ubuntuwslctl.core.schema import lookup
+            config_type, config_section, config_setting = lookup(self._args.name)
             if query_yes_no(_("You are trying to reset `{name}`."
                               "Do you still want to proceed?").format(name=self._args.name),
                             default="no", assume_yes=assume_yes):
@@ -200,24 +419,117 @@ class Application:
                 self.handler.reset_all()
 
     def do_show(self):
-        config_type, config_section, config_setting = config_name_extractor(self._args.name)
-        self.handler.show(config_type, config_section, config_setting, self._args.short, self._args.default)
+        self.backend.show(self._args.name, self._args.short, self._args.default, self._args.format)
 
     def do_update(self):
         print(bcolors.WARNING + _("WARNING: ") + bcolors.ENDC +
               _("you need to restart Ubuntu distribution to take effect."))
-        config_type, config_section, config_setting = config_name_extractor(self._args.name)
-        self.handler.update(config_type, config_section, config_setting, self._args.value)
+        from ubuntuwslctl.core.schema import lookup
+        changes = [lookup(name) + (value,) for name, value in self._assignments()]
+        self.backend.update_batch(changes)
+
+    def _assignments(self):
+        args = self._args.name
+        if len(args) == 2 and "=" not in args[0]:  # update <name> <value>
+            return [(args[0], args[1])]
+        assignments = []
+        for arg in args:
+            if arg == "-":
+                for line in sys.stdin:
+                    line = line.strip()
+                    if line == "" or line.startswith(("#", ";")):
+                        continue
+                    assignments.append(config_assignment_extractor(line))
+            else:
+                assignments.append(config_assignment_extractor(arg))
+        return assignments
 
     def do_ui(self):
         from ubuntuwslctl.tui import Tui
-        Tui(self.handler).run()
+        if self._args.profile is None:
+            Tui(self.handler, self._args.color_fallback).run()
+            return
+        from ubuntuwslctl.core.profiler import TuiProfiler
+        profiler = TuiProfiler()
+        tui = Tui(self.handler, self._args.color_fallback, profiler)
+        try:
+            tui.run()
+        finally:
+            print(_("Profile written to {}.").format(profiler.write(self._args.profile)))
 
     def do_export(self):
-        self.handler.export_file(self._args.file)
+        self.backend.export_file(self._args.file, self._args.sparse, self._args.format, self._args.compact)
 
     def do_import(self):
-        self.handler.import_file(self._args.file)
+        changes = self.handler.import_file(self._args.file, self._args.dry_run)
+        if self._args.dry_run:
+            self._print_changes(changes, self._args.file)
+
+    @staticmethod
+    def _print_changes(changes, source):
+        if not changes:
+            print(_("The settings already match {}, nothing to change.").format(source))
+        for config_type, section, setting, current, new in changes:
+            print("{}.{}.{}: {} -> {}".format(config_type, section, setting, current, new))
+
+    def do_host(self):
+        from ubuntuwslctl.core.host import detect_host
+        address = detect_host(self._args.strategy.split(","))
+        if address is None:
+            sys.exit(1)
+        print(address)
+
+    def do_probe(self):
+        import shlex
+        from ubuntuwslctl.core.probe import probe_all
+        from ubuntuwslctl.utils.helper import str2bool
+        gui, audio = self._args.gui, self._args.audio
+        if not (gui or audio):
+            interop = self.handler.ubuntu_conf.get_config()['Interop']
+            gui = str2bool(interop['guiintegration'])
+            audio = str2bool(interop['audiointegration'])
+        host = self._args.host
+        if host is None:
+            from ubuntuwslctl.core.host import detect_host
+            host = detect_host(self._args.strategy.split(","))
+            if host is None:
+                sys.exit(1)
+        env = probe_all(host, gui, audio, self._args.x_timeout, self._args.pa_timeout, self._args.use_clients)
+        sys.stdout.write("".join("export {}={}\n".format(k, shlex.quote(v)) for k, v in env.items()))
+
+    def do_serve(self):
+        from ubuntuwslctl.core.server import serve
+        serve(self._args.socket)
+
+    def do_profile_save(self):
+        from ubuntuwslctl.core.profile import ProfileStore
+        key = ProfileStore().save(self._args.name, self.handler.export(sparse=True))
+        print(_("Saved the current settings as `{}` ({}).").format(self._args.name, key[:12]))
+
+    def do_profile_list(self):
+        from ubuntuwslctl.core.profile import ProfileStore, digest
+        profiles = ProfileStore().index()
+        if not profiles:
+            print(_("No profile saved yet."))
+            return
+        current = digest(self.handler.export(sparse=True))
+        for name, profile in sorted(profiles.items()):
+            print("{} {:<24} {} {}".format("*" if profile['hash'] == current else " ", name, profile['hash'][:12],
+                                           profile['saved']))
+
+    def do_profile_use(self):
+        from ubuntuwslctl.core.profile import ProfileStore
+        exported = ProfileStore().load(self._args.name)
+        changes = self.handler.import_settings(exported, self._args.dry_run)
+        if self._args.dry_run:
+            self._print_changes(changes, _("the profile `{}`").format(self._args.name))
+        elif changes:
+            print(bcolors.WARNING + _("WARNING: ") + bcolors.ENDC +
+                  _("you need to restart Ubuntu distribution to take effect."))
+
+    def do_profile_rm(self):
+        from ubuntuwslctl.core.profile import ProfileStore
+        ProfileStore().remove(self._args.name)
 
     @staticmethod
     def do_fun():
@@ -230,6 +542,9 @@ class Application:
 
 
 def main():
+    if sys.argv[1:] == ["--version"]:  # fast path, used by scripts
+        print("ubuntuwsl " + VERSION)
+        return
     main_app = Application()
     main_app.run()
 
@@ -20,12 +20,30 @@
 #  On Debian systems, the complete text of the GNU General
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
 
+from functools import lru_cache
+
 import urwid
-from ubuntuwslctl.core.decor import blank, StyledCheckBox, StyledEdit, StyledText, TuiButton
+from ubuntuwslctl.core.decor import blank, LazyListWalker, StyledCheckBox, StyledEdit, StyledText, TuiButton
 from ubuntuwslctl.core.default import conf_def
+from ubuntuwslctl.core.schema import keys, search, search_index, specs
 from ubuntuwslctl.utils.helper import str2bool
 
 
+@lru_cache(maxsize=None)
+def _left_margin():
+    """
+    The left margin of the fields, from the settings of the schema.
+    """
+    left_margin = 0
+    for key in keys:
+        left_margin = max(left_margin, 4 if specs[key]['type'] == 'bool' else len(key[2]) + 2)
+    return left_margin
+
+
+def _is_dirty(widget):
+    return hasattr(widget, "is_dirty") and widget.is_dirty()
+
+
 class Tui:
     """
     Main class of the text-based UI for Ubuntu WSL config management
@@ -45,10 +63,10 @@ class Tui:
         ('focus', 'black', 'light gray')
     ]
 
-    def __init__(self, handler, color_fallback=False):
+    def __init__(self, handler, color_fallback=False, profiler=None):
         self.handler = handler
         self.config = self.handler.get_config()
-        self.content = []
+        self._search_edit = None
         self.screen = urwid.raw_display.Screen()
 
         self.screen.set_terminal_properties(2**24)
@@ -56,9 +74,13 @@ class Tui:
             self.screen.set_terminal_properties(16)
         self.screen.register_palette(self._palette)
 
+        if profiler is not None:
+            profiler.attach(self)
         self._body_builder()
         self._loop = urwid.MainLoop(self._body, screen=self.screen,
                                     unhandled_input=self._unhandled_key)
+        if profiler is not None:
+            profiler.attach_loop(self._loop)
 
     def _fun(self, button=None, fun=None):
         """
@@ -78,23 +100,34 @@ class Tui:
         elif fun == "help":
             self._popup_constructor(fun, urwid.Text((u"Use UP/DOWN/LEFT/RIGHT arrow to navigate between "
                                                      u"option. Use SPACE to toggle the settings. "
-                                                     u" Use ENTER or your mouse to press a button."), align='left'))
+                                                     u" Use ENTER or your mouse to press a button. "
+                                                     u"Press / to search the settings, then ENTER to go "
+                                                     u"through the results or ESC to show all of them."),
+                                                    align='left'))
         elif fun == "reload":
-            self._body_builder()
+            self._refresh()
             self._popup_constructor(fun, urwid.Text(u"Configuration Reloaded.", align='left'))
         elif fun == "save":
-            for i in self.content:
-                if not hasattr(i, "get_source"):
-                    continue
-                j, k, l = i.get_source()
-                m = i.get_core_value()
-                self.handler.update(j, k, l, m)
-            self._body_builder()
-            self._popup_constructor(fun, urwid.Text(u"Saved. Restart Ubuntu to make effect.", align='left'))
+            fields = [i for i in self._fields() if i.is_dirty()]
+            if not fields:
+                self._popup_constructor(fun, urwid.Text(u"Nothing changed, nothing to save.", align='left'))
+                return
+            writes = self.handler.writes
+            try:
+                self.handler.update_batch([tuple(i.get_source()) + (i.get_core_value(),) for i in fields])
+            except AssertionError as e:
+                self._popup_constructor(fun, urwid.Text(u"Nothing saved: {}.".format(e), align='left'))
+                return
+            for i in fields:
+                i.mark_clean()
+            self._popup_constructor(fun, urwid.Text(u"Saved {} changed setting(s) to {} file(s). Restart Ubuntu "
+                                                    u"to make effect.".format(len(fields),
+                                                                              self.handler.writes - writes),
+                                                    align='left'))
         elif fun == "reset":
             def _reset(button):
                 self.handler.reset_all()
-                self._body_builder()
+                self._refresh()
                 self._popup_constructor(fun, urwid.Text(u"Reset complete. Restart Ubuntu to take effect.",
                                                         align='left'))
             body = urwid.Text(u"Do you really want to reset?", align='left')
@@ -128,6 +161,7 @@ class Tui:
                     self._popup_constructor(fun, b)
                 else:
                     self.handler.import_file(exp_name.edit_text)
+                    self._refresh()
                     b = urwid.Text(u"{} imported. Please restart Ubuntu to take effect.".format(exp_name.edit_text),
                                 align='left')
                     self._popup_constructor(fun, b)
@@ -205,62 +239,122 @@ class Tui:
                              title=header.title(), title_attr='header', title_align='center')
 
     def _parse_config(self):
-        self.content = [blank]
-
-        # Widget margin calculation
-        left_margin = 0
-        for i in self.config.keys():
-            i_tmp = self.config[i]
-            for j in i_tmp.keys():
-                j_tmp = i_tmp[j]
-                for k in j_tmp.keys():
-                    if isinstance(j_tmp[k], bool) and (left_margin < 4):
-                        left_margin = 4
-                    elif isinstance(j_tmp[k], str):
-                        if j_tmp[k].lower() in ("yes", "no", "1", "0", "true", "false") and (left_margin < 4):
-                            left_margin = 4
-                        elif left_margin < len(k) + 2:
-                            left_margin = len(k) + 2
-
-        # Real config handling part
-        for i in self.config.keys():
-            self.content.append(StyledText(conf_def[i]['_friendly_name'], 'title'))
-            self.content.append(blank)
-            i_tmp = self.config[i]
-            for j in i_tmp.keys():
-                self.content.append(StyledText(conf_def[i][j]['_friendly_name'], 'subtitle'))
-                self.content.append(blank)
-                j_tmp = i_tmp[j]
-                for k in j_tmp.keys():
-                    if isinstance(j_tmp[k], bool):
-                        self.content.append(StyledCheckBox(conf_def[i][j][k]['_friendly_name'], j_tmp[k],
-                                                           conf_def[i][j][k]['tip'], left_margin, [i, j, k]))
-                    elif isinstance(j_tmp[k], str):
-                        if j_tmp[k].lower() in ("yes", "no", "1", "0", "true", "false"):
-                            self.content.append(StyledCheckBox(conf_def[i][j][k]['_friendly_name'], str2bool(j_tmp[k]),
-                                                               conf_def[i][j][k]['tip'], left_margin, [i, j, k]))
-                        else:
-                            self.content.append(StyledEdit(conf_def[i][j][k]['_friendly_name'], j_tmp[k],
-                                                           conf_def[i][j][k]['tip'], left_margin, [i, j, k]))
-                self.content.append(blank)
+        """
+        Lay out the rows in one pass over the schema. The widgets of the rows are only
+        built once they are shown, see `_row`.
+        """
+        self.rows = [None]
+        self._field_rows = {}
+        last_type, last_section = None, None
+        # in the order of the config types in `self.config`, then of the schema
+        type_order = {config_type: n for n, config_type in enumerate(self.config)}
+        for key in sorted(keys, key=lambda key: type_order[key[0]]):
+            i, j, k = key
+            if (i, j) != (last_type, last_section):
+                if last_section is not None:
+                    self.rows.append(None)
+                if i != last_type:
+                    self.rows.append(('title', conf_def[i]['_friendly_name']))
+                    self.rows.append(None)
+                section_row = len(self.rows)
+                self.rows.append(('subtitle', conf_def[i][j]['_friendly_name']))
+                self.rows.append(None)
+                last_type, last_section = i, j
+            self._field_rows[key] = (len(self.rows), section_row)
+            self.rows.append(('field', key))
+        self.rows.append(None)
+
+    def _row(self, position):
+        """
+        Build the widget of a row, with the values of `self.config` for the fields.
+        """
+        row = self.rows[position]
+        if row is None:
+            return blank
+        style, value = row
+        if style != 'field':
+            return StyledText(value, style)
+        i, j, k = value
+        k_spec = specs[value]
+        if k_spec['type'] == 'bool':
+            return StyledCheckBox(k_spec['_friendly_name'], str2bool(self.config[i][j][k]), k_spec['tip'],
+                                  _left_margin(), [i, j, k])
+        return StyledEdit(k_spec['_friendly_name'], self.config[i][j][k], k_spec['tip'], _left_margin(), [i, j, k])
+
+    def _fields(self):
+        """
+        The fields built so far. The others cannot hold any change.
+        """
+        return [widget for _row, widget in self._walker.built() if hasattr(widget, "get_source")]
+
+    def _refresh(self):
+        """
+        Update the fields in place from the conf files, so that the focus and the scroll position are kept.
+        """
+        self.handler.invalidate()
+        self.config = self.handler.get_config()
+        for field in self._fields():
+            i, j, k = field.get_source()
+            field.set_core_value(self.config[i][j][k])
 
     def _body_builder(self):
         """
         Allows building the body.
-        Also used in page refreshing after a reset and when pressing reload botton
         """
         self._parse_config()
 
         header = urwid.AttrWrap(urwid.Text(u"Ubuntu WSL Configuration UI (Experimental)", align='center'), 'header')
-        footer = urwid.AttrWrap(self._footer(), 'footer')
-        listbox = urwid.TreeListBox(urwid.SimpleListWalker(self.content))
+        footer = self._buttons = urwid.AttrWrap(self._footer(), 'footer')
+        self._walker = LazyListWalker(range(len(self.rows)), self._row, keep=_is_dirty)
+        listbox = urwid.TreeListBox(self._walker)
         self._body = urwid.Frame(urwid.AttrWrap(listbox, 'body'), header=header, footer=footer)
 
+    def _search(self):
+        """
+        Enter the search mode: the rows are filtered while typing in the footer.
+        ENTER goes back to the filtered rows, ESC shows all the rows again,
+        keeping the focus on the row it was on.
+        """
+        search_index()  # built once, before the first keystroke
+        self._search_edit = urwid.Edit(u"/")
+        urwid.connect_signal(self._search_edit, 'change', lambda edit, text: self._filter(text))
+        self._body.footer = urwid.AttrWrap(self._search_edit, 'footer')
+        self._body.focus_position = 'footer'
+
+    def _filter(self, query):
+        """
+        Only show the settings matching the query, see `schema.search`, under their section titles.
+        """
+        if query.strip() == "":
+            self._walker.set_items(range(len(self.rows)))
+            return
+        found = search(query)
+        rows = [0]
+        for key, (row, section_row) in self._field_rows.items():
+            if key in found:
+                if rows[-1] < section_row:
+                    rows.extend((section_row, section_row + 1))
+                rows.append(row)
+        self._walker.set_items(rows, focus=min(3, len(rows) - 1))
+
+    def _end_search(self, keep_filter):
+        if not keep_filter:
+            _widget, position = self._walker.get_focus()
+            row = self._walker.items[position] if position is not None else 0
+            self._walker.set_items(range(len(self.rows)), focus=row)
+        self._search_edit = None
+        self._body.footer = self._buttons
+        self._body.focus_position = 'body'
+
     def _unhandled_key(self, key):
         """
         handle keys
         """
-        if key in ('f7', 'ctrl c', 'esc'):
+        if self._search_edit is not None and key in ('enter', 'esc'):
+            self._end_search(keep_filter=key == 'enter')
+        elif key == '/':
+            self._search()
+        elif key in ('f7', 'ctrl c', 'esc'):
             self._fun(fun='exit')
         elif key == 'f6':
             self._fun(fun='help')
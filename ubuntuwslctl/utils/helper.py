@@ -19,8 +19,8 @@
 #
 #  On Debian systems, the complete text of the GNU General
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
+import os
 import sys
-from configparser import ConfigParser
 
 from ubuntuwslctl.utils.i18n import translation
 
@@ -38,20 +38,72 @@ class bcolors:
     UNDERLINE = '\033[4m'
 
 
-def config_name_extractor(config_name):
-    config_name_set = config_name.split(".")
-    # it should always be three level: the type, the section, and the config.
-    if len(config_name_set) == 3:
-        return config_name_set[0], config_name_set[1], config_name_set[2]
-    elif len(config_name_set) == 2:  # if type is missing, guess
-        if config_name_set[0] in ("ubuntu", "wsl") and config_name_set[1] == "*":  # top level wild card
-            return config_name_set[0], config_name_set[1], ""
-        else:  # other cases
-            type_name = "ubuntu" if config_name_set[0] in (
-                "Motd", "Interop") else "wsl"
-            return type_name, config_name_set[0], config_name_set[1]
-    else:  # invaild name, return nothing
-        return "", "", ""
+def atomic_write(path, content, mode=None):
+    """
+    Write `content` to `path`.
+    The write is skipped when the file already holds the same content, otherwise
+    the content goes to a temporary file that atomically replaces the file.
+    A symlink is followed, so that the file it points to is replaced, and the file
+    keeps its mode, owner and group.
+
+    Args:
+        path: the location of the file.
+        content: the content to write, either `str` or `bytes`.
+        mode: the mode of the file, set before its content can be read; by default the mode
+            of the file it replaces, or 0o644.
+    Returns:
+        True if the file is written, False if the write is skipped.
+    """
+    binary = 'b' if isinstance(content, bytes) else ''
+    path = os.path.realpath(path)
+    st = None
+    if os.path.exists(path):
+        st = os.stat(path)
+        with open(path, 'r' + binary) as f:
+            if f.read() == content:
+                if mode is not None and st.st_mode & 0o7777 != mode:
+                    os.chmod(path, mode)
+                return False
+
+    import tempfile
+    file_dir, file_name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix="." + file_name + ".", dir=file_dir or ".")
+    try:
+        with os.fdopen(fd, 'w' + binary) as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if st is not None:
+            if (st.st_uid, st.st_gid) != (os.getuid(), os.getgid()):
+                os.chown(tmp_path, st.st_uid, st.st_gid)
+        if mode is None:
+            mode = 0o644 if st is None else st.st_mode & 0o7777
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return True
+
+
+def timestamp():
+    """
+    The current time in UTC, as written in the exports and in the names of the generated files,
+    e.g. `20210131235959UTC`.
+    """
+    import time
+    return time.strftime("%Y%m%d%H%M%SUTC", time.gmtime())
+
+
+def config_assignment_extractor(assignment):
+    """
+    Split a `name=value` assignment into the name and the value.
+    Only the first `=` is used as separator, so the value can contain `=` as well.
+    """
+    assert "=" in assignment, _("`{name}` is not in the form of name=value").format(name=assignment)
+    name, value = assignment.split("=", 1)
+    return name.strip(), value.strip()
 
 
 def str2bool(s):
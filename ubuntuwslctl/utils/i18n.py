@@ -20,10 +20,34 @@
 #  On Debian systems, the complete text of the GNU General
 #  Public License version 3 can be found in "/usr/share/common-licenses/GPL-3".
 import os
-import gettext
 
 localedir = '/usr/share/locale'
 build_mo = os.path.realpath(__file__ + '/../../build/mo/')
 if os.path.isdir(build_mo):
     localedir = build_mo
-translation = gettext.translation('ubuntuwslctl', localedir=localedir, fallback=True)
\ No newline at end of file
+
+
+class _LazyTranslation:
+    """
+    Looks up the translation catalog only when the first message is translated,
+    so that commands printing nothing translatable do not pay for it.
+    """
+
+    def __init__(self):
+        self._translation = None
+
+    def gettext(self, message):
+        if self._translation is None:
+            import gettext
+            self._translation = gettext.translation('ubuntuwslctl', localedir=localedir, fallback=True)
+        return self._translation.gettext(message)
+
+
+translation = _LazyTranslation()
+
+
+def N_(message):
+    """
+    Mark a message for extraction by xgettext, leaving it to be translated where it is shown.
+    """
+    return message